@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf8
+
+"""
+Compares serialization and parsing of the __slots__ metadata model against
+the previous generic model (attributes in __dict__, recursive VJSONEncoder).
+
+Usage: python benchmarks/bench_metadata.py [--versions 10000] [--rounds 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from vgrepo.meta.images import VMetadataImage  # noqa: E402
+from vgrepo.utils import VJSONEncoder  # noqa: E402
+
+
+class LegacyObject(object):
+
+    def json_repr(self):
+        data = {}
+        for k, v in vars(self).items():
+            data.update(dict({k: v}))
+
+        return data
+
+    @classmethod
+    def from_json(cls, attributes):
+        attr = {}
+        for k, v in attributes.items():
+            attr.update(dict({k: v}))
+
+        return cls(**attr)
+
+    def to_json(self, compact=False):
+        if compact:
+            return json.dumps(self.json_repr(), cls=VJSONEncoder, separators=(',', ':'), sort_keys=True)
+
+        return json.dumps(self.json_repr(), cls=VJSONEncoder, indent=4, sort_keys=True)
+
+
+class LegacyImage(LegacyObject):
+
+    def __init__(self, name=None, versions=None, description=None):
+        self.name = name
+        self.description = description
+        self.versions = [v if isinstance(v, LegacyVersion) else LegacyVersion().from_json(v)
+                         for v in versions] if versions else []
+
+
+class LegacyVersion(LegacyObject):
+
+    def __init__(self, version=None, providers=None):
+        self.version = version
+        self.providers = [p if isinstance(p, LegacyProvider) else LegacyProvider().from_json(p)
+                          for p in providers] if providers else None
+
+
+class LegacyProvider(LegacyObject):
+
+    def __init__(self, url=None, name=None, checksum_type=None, checksum=None):
+        self.url = url
+        self.name = name
+        self.checksum_type = checksum_type
+        self.checksum = checksum
+
+
+def document(versions):
+    """
+    Returns raw metadata document with given amount of versions
+    """
+    return {
+        'name': 'bench',
+        'description': 'Synthetic metadata',
+        'versions': [{
+            'version': '1.{0}.{1}'.format(i // 100, i % 100),
+            'providers': [{
+                'name': 'virtualbox',
+                'url': 'http://localhost:8080/bench/bench-1.{0}.{1}.box'.format(i // 100, i % 100),
+                'checksum_type': 'sha256',
+                'checksum': '{0:064x}'.format(i),
+            }],
+        } for i in range(versions)],
+    }
+
+
+def measure(func, rounds):
+    """
+    Returns the best time of the function in seconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=rounds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--versions', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    raw = document(args.versions)
+    legacy, compact = LegacyImage.from_json(raw), VMetadataImage.from_json(raw)
+
+    assert json.loads(legacy.to_json()) == json.loads(compact.to_json())
+
+    cases = [
+        ('parse', lambda: LegacyImage.from_json(raw), lambda: VMetadataImage.from_json(raw)),
+        ('dump', legacy.to_json, compact.to_json),
+        ('compact', lambda: legacy.to_json(compact=True), lambda: compact.to_json(compact=True)),
+    ]
+
+    print("{0:<8}{1:>14}{2:>14}{3:>10}".format("case", "legacy, ms", "slots, ms", "speedup"))
+    for name, old, new in cases:
+        before, after = measure(old, args.rounds), measure(new, args.rounds)
+        print("{0:<8}{1:>14.2f}{2:>14.2f}{3:>9.1f}x".format(name, before * 1000, after * 1000, before / after))
+
+
+if __name__ == '__main__':
+    main()
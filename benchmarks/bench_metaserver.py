@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf8
+
+"""
+Load test of the metadata endpoints. Requests per second of the asyncio
+metadata server (vgrepo serve --metadata-only) are compared with the
+threaded server (vgrepo serve) and the static-file baseline, which is the
+standard library file server over the same storage. Every client keeps its
+connection alive and requests metadata of random repositories.
+
+Usage: python benchmarks/bench_metaserver.py [--repos N] [--clients N] [--seconds N]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+
+try:
+    import http.client as httplib
+except ImportError:
+    import httplib
+
+SERVERS = {
+    'static': """
+import sys
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+class Handler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    def log_message(self, *args):
+        pass
+    def translate_path(self, path):
+        # Same mapping as /<name>/ -> /<name>/metadata/<name>.json in nginx
+        name = path.strip('/')
+        return '{root}/' + name + '/metadata/' + name + '.json'
+ThreadingHTTPServer(('127.0.0.1', {port}), Handler).serve_forever()
+""",
+    'threaded': """
+import sys
+sys.path.insert(0, {lib!r})
+from vgrepo.server import VServer
+from vgrepo.settings import VSettings
+settings = VSettings({cnf!r})
+VServer(('127.0.0.1', {port}), settings).serve_forever()
+""",
+    'asyncio': """
+import sys
+sys.path.insert(0, {lib!r})
+from vgrepo.metaserver import VMetadataService
+from vgrepo.settings import VSettings
+VMetadataService(VSettings({cnf!r})).run(('127.0.0.1', {port}))
+""",
+}
+
+
+def storage(path, repos, versions):
+    """
+    Creates storage with metadata of given amount of repositories
+    """
+    from vgrepo.meta.images import VMetadataImage, VMetadataVersion, VMetadataProvider
+    from vgrepo.storage import VStorage
+
+    cnf = os.path.join(path, 'vgrepo.conf')
+    with open(cnf, 'w') as stream:
+        stream.write('storage:\n  path: "{0}"\n  url: "http://127.0.0.1"\n'.format(os.path.join(path, 'storage')))
+
+    s = VStorage(cnf)
+    for i in range(repos):
+        name = 'box{0:05d}'.format(i)
+        r = s.repository(name)
+        r.meta = VMetadataImage(name=name, description='Benchmark box', versions=[
+            VMetadataVersion(version='1.0.{0}'.format(v), providers=[VMetadataProvider(
+                name='virtualbox', url=r.get_image_url('1.0.{0}'.format(v)),
+                checksum_type='sha256', checksum='0' * 64,
+            )]) for v in range(versions)
+        ])
+        r.make_image_dir()
+        r.commit()
+
+    return cnf, s.settings.storage_path
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def wait(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except (OSError, IOError):
+            time.sleep(0.05)
+    raise RuntimeError("Server on port {0} did not start".format(port))
+
+
+def client(args):
+    """
+    Requests metadata over one keep-alive connection for given time and
+    returns amount of successful responses
+    """
+    port, names, seconds, seed = args
+    rnd = random.Random(seed)
+    conn = httplib.HTTPConnection('127.0.0.1', port)
+    done = 0
+    deadline = time.time() + seconds
+
+    while time.time() < deadline:
+        conn.request('GET', '/{0}/'.format(rnd.choice(names)))
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError("Unexpected status {0}".format(response.status))
+        done += 1
+
+    conn.close()
+    return done
+
+
+def load(port, names, clients, seconds):
+    pool = multiprocessing.Pool(clients)
+    try:
+        started = time.time()
+        total = sum(pool.map(client, [(port, names, seconds, i) for i in range(clients)]))
+        return total / (time.time() - started)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--repos', type=int, default=500)
+    parser.add_argument('--versions', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='vgrepo-bench-')
+    try:
+        cnf, root = storage(path, args.repos, args.versions)
+        names = ['box{0:05d}'.format(i) for i in range(args.repos)]
+
+        print("{0:<12}{1:>14}".format("server", "requests/s"))
+
+        for server in ('static', 'threaded', 'asyncio'):
+            port = free_port()
+            code = SERVERS[server].format(lib=os.path.join(ROOT, 'lib'), cnf=cnf, root=root, port=port)
+            proc = subprocess.Popen([sys.executable, '-c', code])
+            try:
+                wait(port)
+                rate = load(port, names, args.clients, args.seconds)
+                print("{0:<12}{1:>14.0f}".format(server, rate))
+
+                if server == 'asyncio':
+                    conn = httplib.HTTPConnection('127.0.0.1', port)
+                    conn.request('GET', '/-/stats')
+                    print("cache: {0}".format(json.loads(conn.getresponse().read().decode('utf-8'))))
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
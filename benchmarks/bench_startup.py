@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding: utf8
+
+"""
+Measures start-up time of the CLI commands against the budget tracked in
+benchmarks/startup_budget.json. Time of a bare interpreter is subtracted,
+so the budget describes overhead of vgrepo itself. Exits with non-zero
+status if any command is over its budget or imports forbidden modules.
+
+Usage: python benchmarks/bench_startup.py [--rounds N] [--budget FILE]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BUDGET = os.path.join(ROOT, 'benchmarks', 'startup_budget.json')
+
+# Runs the command the same way as bin/vgrepo does and reports loaded modules
+RUNNER = """
+import sys
+sys.path.insert(0, {lib!r})
+sys.argv = ['vgrepo'] + {argv!r}
+from vgrepo.client import VCLIApplication
+VCLIApplication({cnf!r})
+sys.stderr.write('\\nMODULES ' + ' '.join(sorted(sys.modules)) + '\\n')
+"""
+
+
+def run(code, env=None):
+    """
+    Returns wall time in seconds and stderr of the interpreter running given code
+    """
+    started = time.time()
+    proc = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    _, err = proc.communicate()
+    elapsed = time.time() - started
+
+    if proc.returncode != 0:
+        raise RuntimeError(err.decode('utf-8', 'replace'))
+
+    return elapsed, err.decode('utf-8', 'replace')
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def storage(path):
+    """
+    Creates configuration with the storage which contains a single repository
+    """
+    repo = os.path.join(path, 'storage', 'bench', 'metadata')
+    os.makedirs(repo)
+
+    with open(os.path.join(repo, 'bench.json'), 'w') as stream:
+        json.dump({'name': 'bench', 'description': None, 'versions': [{
+            'version': '1.0.0',
+            'providers': [{'name': 'virtualbox', 'url': 'http://localhost/bench/bench-1.0.0.box',
+                           'checksum_type': 'sha256', 'checksum': '0' * 64}],
+        }]}, stream)
+
+    cnf = os.path.join(path, 'vgrepo.conf')
+    with open(cnf, 'w') as stream:
+        stream.write('storage:\n  path: "{0}"\n  url: "http://localhost"\n'.format(os.path.join(path, 'storage')))
+
+    return cnf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int)
+    parser.add_argument('--budget', default=BUDGET)
+    args = parser.parse_args()
+
+    with open(args.budget) as stream:
+        budget = json.load(stream)
+    rounds = args.rounds or budget.get('rounds', 15)
+
+    tmp = tempfile.mkdtemp(prefix='vgrepo-bench-')
+    try:
+        cnf = storage(tmp)
+        lib = os.path.join(ROOT, 'lib')
+
+        # Keep compiled configuration away from the user's cache and measure
+        # with byte-compiled modules as an installed package does
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(tmp, 'cache'))
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        bare = median([run('pass')[0] for _ in range(rounds)])
+        failed = False
+
+        print("{0:<10}{1:>14}{2:>14}  {3}".format("command", "overhead, ms", "budget, ms", "status"))
+        for name, spec in sorted(budget['commands'].items()):
+            code = RUNNER.format(lib=lib, argv=spec['argv'], cnf=cnf)
+
+            # Warm up the page cache, compiled configuration and the catalog
+            run(code, env)
+            _, err = run(code, env)
+            modules = set(err.rsplit('MODULES ', 1)[-1].split())
+
+            overhead = (median([run(code, env)[0] for _ in range(rounds)]) - bare) * 1000
+            loaded = sorted(m for m in spec.get('forbidden', []) if m in modules)
+
+            status = "OK"
+            if overhead > spec['budget_ms']:
+                status = "OVER BUDGET"
+            if loaded:
+                status = "IMPORTS {0}".format(", ".join(loaded))
+            failed = failed or status != "OK"
+
+            print("{0:<10}{1:>14.1f}{2:>14}  {3}".format(name, overhead, spec['budget_ms'], status))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
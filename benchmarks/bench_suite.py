@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf8
+
+"""
+Times the main operations of the storage on a synthetic storage built by
+benchmarks/generate.py: VStorage.add, list, remove, usage and has_version,
+parsing and dumping of metadata and hashing throughput. Results are written
+as JSON and compared with the stored baseline, the exit status is non-zero if
+any operation is slower than the baseline by more than the threshold.
+
+Usage: python benchmarks/bench_suite.py [--baseline FILE] [--output FILE] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from generate import generate, parse_size, sparse_box  # noqa: E402
+
+from vgrepo.meta.images import VMetadataImage  # noqa: E402
+from vgrepo.repository import VRepository  # noqa: E402
+from vgrepo.storage import VStorage  # noqa: E402
+from vgrepo.utils import timer  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def measure(ops, func, rounds=5):
+    """
+    Returns the best time of given rounds in seconds per operation
+    """
+    best = None
+
+    for _ in range(rounds):
+        started = timer()
+        func()
+        elapsed = timer() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / ops
+
+
+def bench(path, args):
+    """
+    Runs every benchmark and returns results by their names
+    """
+    box_size = parse_size(args.box_size)
+    cnf = generate(path, args.repos, args.versions, args.providers, box_size)
+    storage = VStorage(cnf)
+    results = {}
+
+    def result(name, seconds, size=None):
+        results[name] = {'seconds': seconds}
+        if size:
+            results[name]['mb_per_second'] = size / seconds / 1048576.0
+
+    names = ['box{0:05d}'.format(i) for i in range(args.repos)]
+    rnd = random.Random(0)
+
+    src = os.path.join(path, 'source.box')
+    sparse_box(src, box_size)
+
+    # Every add goes to a new version, so rounds of the same batch can not be repeated
+    added = []
+
+    def add():
+        for i in range(args.adds):
+            version = '9.{0}.{1}'.format(len(added), i)
+            storage.add(src, names[i % len(names)], version)
+            added.append((names[i % len(names)], version))
+
+    result('add', measure(args.adds, add, rounds=1), box_size)
+
+    def remove():
+        for name, version in added:
+            storage.remove(name, version)
+
+    result('remove', measure(len(added), remove, rounds=1))
+
+    result('list', measure(1, storage.list))
+    result('scan', measure(1, lambda: list(storage.scan())))
+    result('usage', measure(1, lambda: list(storage.usage())))
+
+    repos = [storage.repository(n) for n in names[:10]]
+    for r in repos:
+        r.versions
+    lookups = ['{0}.{1}.{2}'.format(1 + v // 100, (v // 10) % 10, v % 10) for v in range(args.versions)] + ['0.0.0']
+
+    def has_version():
+        for _ in range(args.lookups):
+            rnd.choice(repos).has_version(rnd.choice(lookups))
+
+    result('has_version', measure(args.lookups, has_version))
+
+    r = storage.repository(names[0])
+    with open(r.meta_path, 'r') as stream:
+        data = stream.read()
+    meta = VMetadataImage.from_json(json.loads(data))
+
+    n = args.iterations
+    result('meta_parse', measure(n, lambda: [VMetadataImage.from_json(json.loads(data)) for _ in range(n)]))
+    result('meta_dump', measure(n, lambda: [meta.to_json() for _ in range(n)]))
+    result('meta_dump_compact', measure(n, lambda: [meta.to_json(compact=True) for _ in range(n)]))
+
+    result('hash', measure(1, lambda: VRepository.get_sha256_checksum(src)), box_size)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints results next to the baseline and returns names of regressed operations
+    """
+    regressed = []
+
+    print("{0:<20}{1:>14}{2:>14}{3:>10}".format("operation", "ms/op", "baseline", "ratio"))
+
+    for name in sorted(results):
+        seconds = results[name]['seconds']
+        base = baseline.get(name, {}).get('seconds')
+        ratio = seconds / base if base else None
+        status = ''
+
+        if ratio is not None and ratio > threshold:
+            regressed.append(name)
+            status = '  SLOWER'
+
+        print("{0:<20}{1:>14.4f}{2:>14}{3:>10}{4}".format(
+            name,
+            seconds * 1000.0,
+            "{0:.4f}".format(base * 1000.0) if base else '-',
+            "{0:.2f}".format(ratio) if ratio else '-',
+            status,
+        ))
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--repos', type=int, default=200)
+    parser.add_argument('--versions', type=int, default=20)
+    parser.add_argument('--providers', type=int, default=2)
+    parser.add_argument('--box-size', default='8M')
+    parser.add_argument('--adds', type=int, default=20)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=1000, help='rounds of metadata parse and dump')
+    parser.add_argument('--threshold', type=float, default=2.0, help='allowed ratio to the baseline')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--output', help='write results to the JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='replace the baseline by the results')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='vgrepo-bench-')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(path, 'cache')
+
+    try:
+        results = bench(path, args)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    report = {
+        'python': platform.python_version(),
+        'params': {
+            'repos': args.repos,
+            'versions': args.versions,
+            'providers': args.providers,
+            'box_size': args.box_size,
+            'adds': args.adds,
+            'lookups': args.lookups,
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+
+    baseline = {}
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as stream:
+            stored = json.load(stream)
+        if stored.get('params') != report['params']:
+            print("Warning: parameters differ from the baseline, ratios are not comparable")
+        baseline = stored.get('results', {})
+
+    regressed = compare(results, baseline, args.threshold)
+
+    for path in [args.output, args.baseline if args.save_baseline else None]:
+        if path:
+            with open(path, 'w') as stream:
+                json.dump(report, stream, indent=4, sort_keys=True)
+                stream.write('\n')
+
+    if regressed:
+        print("Slower than the baseline: {0}".format(", ".join(regressed)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf8
+
+"""
+Generates synthetic storage for benchmarks: N repositories with M versions
+and P providers per version. Boxes are sparse files of the given size, so
+large storages take little disk space, but hashing still reads every byte.
+
+Usage: python benchmarks/generate.py DIR [--repos N] [--versions M] [--providers P] [--box-size SIZE]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from vgrepo.meta.images import VMetadataImage, VMetadataVersion, VMetadataProvider  # noqa: E402
+from vgrepo.repository import VRepository  # noqa: E402
+from vgrepo.storage import VStorage  # noqa: E402
+
+PROVIDERS = ['virtualbox', 'libvirt', 'vmware_desktop', 'hyperv', 'parallels', 'docker']
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value):
+    """
+    Returns amount of bytes by given size string (e.g. 512K, 16M, 1G)
+    """
+    value = str(value).strip().upper().rstrip('B')
+    unit = value[-1:] if value[-1:] in UNITS else ''
+
+    return int(float(value[:len(value) - len(unit)]) * UNITS[unit])
+
+
+def sparse_box(path, size):
+    """
+    Creates sparse file of given size
+    """
+    with open(path, 'wb') as stream:
+        stream.truncate(size)
+
+
+def zeros_checksum(size):
+    """
+    Returns SHA256 of the sparse box without reading it from the disk
+    """
+    sha256 = hashlib.sha256()
+    chunk = b'\0' * 1048576
+
+    for _ in range(size // len(chunk)):
+        sha256.update(chunk)
+    sha256.update(b'\0' * (size % len(chunk)))
+
+    return sha256.hexdigest()
+
+
+def configure(path):
+    """
+    Writes configuration of the storage placed in the given directory and
+    returns path to it
+    """
+    cnf = os.path.join(path, 'vgrepo.conf')
+
+    with open(cnf, 'w') as stream:
+        stream.write('storage:\n  path: "{0}"\n  url: "http://localhost:8080"\n'.format(os.path.join(path, 'storage')))
+
+    return cnf
+
+
+def generate(path, repos=100, versions=10, providers=1, box_size=1048576):
+    """
+    Creates storage with synthetic repositories and returns path to its
+    configuration. Metadata is written directly and the catalog is built once
+    at the end, as vgrepo reindex does.
+    """
+    cnf = configure(path)
+    storage = VStorage(cnf)
+    checksum = zeros_checksum(box_size)
+
+    for i in range(repos):
+        name = 'box{0:05d}'.format(i)
+        r = VRepository(name, storage.settings, VMetadataImage(name=name, description='Synthetic box {0}'.format(i)))
+        r.make_image_dir()
+
+        for v in range(versions):
+            version = '{0}.{1}.{2}'.format(1 + v // 100, (v // 10) % 10, v % 10)
+            sparse_box(r.get_image_path(version), box_size)
+            r.meta.versions.append(VMetadataVersion(version=version, providers=[
+                VMetadataProvider(
+                    name=PROVIDERS[p % len(PROVIDERS)],
+                    url=r.get_image_url(version),
+                    checksum_type='sha256',
+                    checksum=checksum,
+                ) for p in range(providers)
+            ]))
+
+        r.dump_meta()
+
+    storage.reindex()
+
+    return cnf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('path', help='directory of the storage')
+    parser.add_argument('--repos', type=int, default=100)
+    parser.add_argument('--versions', type=int, default=10)
+    parser.add_argument('--providers', type=int, default=1)
+    parser.add_argument('--box-size', default='1M')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.path):
+        os.makedirs(args.path)
+
+    cnf = generate(args.path, args.repos, args.versions, args.providers, parse_size(args.box_size))
+    print(cnf)
+
+
+if __name__ == '__main__':
+    main()
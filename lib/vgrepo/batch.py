@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import json
+import numbers
+import os
+
+import yaml
+
+
+class VBatchEntry:
+    """
+    Describes single image of the batch
+    """
+
+    def __init__(self, src, version, name=None, provider=None, desc=None):
+        """
+        :param src: path to the loadable image file
+        :type src: str
+        :param version: version of the image
+        :type version: str
+        :param name: identifier of the image
+        :type name: str
+        :param provider: provider of the image (e.g. virtualbox)
+        :type provider: str
+        :param desc: description of the image
+        :type desc: str
+        """
+        self.src = src
+        self.version = str(version)
+        self.name = name or os.path.basename(src).replace(".box", "")
+        self.provider = provider
+        self.desc = desc
+
+
+class VManifest:
+    """
+    Reads list of images for the batch from YAML, JSON or NDJSON file
+    """
+
+    KEYS = ('src', 'version', 'name', 'provider', 'desc')
+
+    @staticmethod
+    def parse(path, stream):
+        """
+        Returns list of raw entries by given manifest stream, the format is
+        detected by extension of the file
+
+        :param path: path to the manifest file
+        :type path: str
+        :param stream: opened manifest file
+        :return: list of dict
+        """
+        ext = os.path.splitext(path)[1].lower()
+
+        if ext in ('.ndjson', '.jsonl'):
+            data = [json.loads(line) for line in stream if line.strip()]
+        elif ext == '.json':
+            data = json.load(stream)
+        else:
+            data = yaml.safe_load(stream)
+
+        if isinstance(data, dict):
+            data = data.get('boxes')
+
+        if not isinstance(data or [], list):
+            raise ValueError("Manifest should contain a list of images")
+
+        for item in data or []:
+            if not isinstance(item, dict):
+                raise ValueError("Manifest entry should be a mapping: {0}".format(item))
+
+        return data or []
+
+    @staticmethod
+    def read(path):
+        """
+        Returns entries of the batch by given manifest file, relative paths of
+        the images are resolved against directory of the manifest
+
+        :param path: path to the manifest file
+        :type path: str
+        :return: list of VBatchEntry
+        """
+        with open(path, 'r') as stream:
+            items = VManifest.parse(path, stream)
+
+        base = os.path.dirname(os.path.abspath(path))
+        entries = []
+
+        for item in items:
+            if not item.get('src') or not item.get('version'):
+                raise ValueError("Manifest entry requires src and version: {0}".format(item))
+
+            # YAML and JSON turn unquoted versions into numbers (e.g. 1.10 into 1.1)
+            if isinstance(item['version'], numbers.Number):
+                raise ValueError("Version of {0} is read as number {1}, quote it (e.g. version: \"1.10\")".format(
+                    item['src'], item['version']
+                ))
+
+            attr = dict((k, item.get(k)) for k in VManifest.KEYS)
+            attr['src'] = os.path.join(base, os.path.expanduser(attr['src']))
+            entries.append(VBatchEntry(**attr))
+
+        return entries
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import json
+import os
+import sqlite3
+
+from .meta.images import VMetadataImage
+from .meta.versions import VVersionIndex
+
+
+class VCatalog:
+    """
+    Persistent index of the repositories metadata at the storage root
+    """
+
+    FILENAME = "catalog.db"
+
+    # Version of the schema, catalog with another version is rebuilt
+    VERSION = 3
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS repos (name TEXT PRIMARY KEY, meta TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS summaries (name TEXT PRIMARY KEY, summary TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS sizes (name TEXT NOT NULL, version TEXT NOT NULL, bytes INTEGER NOT NULL, "
+        "PRIMARY KEY (name, version))",
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, "
+        "PRIMARY KEY (name, labels))",
+    ]
+
+    @staticmethod
+    def encode(meta):
+        """
+        Returns compact JSON representation of the metadata
+
+        :param meta: metadata of the repository
+        :type meta: VMetadataImage
+        :return: str
+        """
+        return meta.to_json(compact=True)
+
+    @staticmethod
+    def decode(data):
+        """
+        Returns metadata object by given JSON string
+
+        :param data: JSON representation of the metadata
+        :type data: str
+        :return: VMetadataImage
+        """
+        return VMetadataImage.from_json(json.loads(data))
+
+    @staticmethod
+    def summarize(meta, url):
+        """
+        Returns compact JSON with name, description and the latest version of
+        the repository for the root catalog
+
+        :param meta: metadata of the repository
+        :type meta: VMetadataImage
+        :param url: URL of the repository
+        :type url: str
+        :return: str
+        """
+        latest = VVersionIndex(meta.versions).latest
+
+        return json.dumps({
+            'name': meta.name,
+            'description': meta.description,
+            'url': url,
+            'latest': latest.version if latest else None,
+            'versions': len(meta.versions or []),
+        }, separators=(',', ':'), sort_keys=True)
+
+    def __init__(self, path):
+        """
+        :param path: path to the catalog database
+        :type path: str
+        """
+        self.path = path
+        self.conn = None
+
+    @property
+    def exists(self):
+        """
+        Returns is the catalog saved on the disk or not
+
+        :return: bool
+        """
+        return os.path.isfile(self.path)
+
+    @property
+    def version(self):
+        """
+        Returns version of the catalog's schema
+
+        :return: int
+        """
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    @property
+    def connection(self):
+        """
+        Returns connection to the catalog, creating the database if needed
+
+        :return: sqlite3.Connection
+        """
+        if self.conn is None:
+            path = os.path.dirname(self.path)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+            self.conn = sqlite3.connect(self.path)
+            for statement in VCatalog.SCHEMA:
+                self.conn.execute(statement)
+            self.conn.commit()
+
+        return self.conn
+
+    @staticmethod
+    def insert(conn, meta, url, sizes):
+        """
+        Writes metadata, summary and sizes of the images of the repository
+
+        :param conn: connection with an open transaction
+        :type conn: sqlite3.Connection
+        :param meta: metadata of the repository
+        :type meta: VMetadataImage
+        :param url: URL of the repository
+        :type url: str
+        :param sizes: sizes of the images in bytes by their versions
+        :type sizes: dict
+        :return:
+        """
+        conn.execute(
+            "INSERT OR REPLACE INTO repos (name, meta) VALUES (?, ?)",
+            (meta.name, VCatalog.encode(meta))
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO summaries (name, summary) VALUES (?, ?)",
+            (meta.name, VCatalog.summarize(meta, url))
+        )
+        conn.execute("DELETE FROM sizes WHERE name = ?", (meta.name,))
+        conn.executemany(
+            "INSERT INTO sizes (name, version, bytes) VALUES (?, ?, ?)",
+            [(meta.name, version, size) for version, size in sizes.items()]
+        )
+
+    def update(self, meta, url, sizes=None):
+        """
+        Saves metadata of the repository in the catalog
+
+        :param meta: metadata of the repository
+        :type meta: VMetadataImage
+        :param url: URL of the repository
+        :type url: str
+        :param sizes: sizes of the images in bytes by their versions
+        :type sizes: dict
+        :return:
+        """
+        with self.connection as conn:
+            VCatalog.insert(conn, meta, url, sizes or {})
+
+    def remove(self, name):
+        """
+        Removes repository from the catalog
+
+        :param name: name of the repository
+        :type name: str
+        :return:
+        """
+        with self.connection as conn:
+            conn.execute("DELETE FROM repos WHERE name = ?", (name,))
+            conn.execute("DELETE FROM summaries WHERE name = ?", (name,))
+            conn.execute("DELETE FROM sizes WHERE name = ?", (name,))
+
+    def get(self, name):
+        """
+        Returns metadata of the repository or None if it is not indexed
+
+        :param name: name of the repository
+        :type name: str
+        :return: VMetadataImage
+        """
+        row = self.connection.execute("SELECT meta FROM repos WHERE name = ?", (name,)).fetchone()
+
+        return VCatalog.decode(row[0]) if row else None
+
+    def sizes(self, name):
+        """
+        Returns recorded sizes of the images of the repository
+
+        :param name: name of the repository
+        :type name: str
+        :return: dict of sizes in bytes by versions
+        """
+        cursor = self.connection.execute("SELECT version, bytes FROM sizes WHERE name = ?", (name,))
+
+        return dict(cursor.fetchall())
+
+    def usage(self, name=None):
+        """
+        Returns recorded sizes of the images of every repository or the given one
+
+        :param name: name of the repository (optional)
+        :type name: str
+        :return: dict of sizes in bytes by (name, version)
+        """
+        if name:
+            cursor = self.connection.execute("SELECT name, version, bytes FROM sizes WHERE name = ?", (name,))
+        else:
+            cursor = self.connection.execute("SELECT name, version, bytes FROM sizes")
+
+        return dict(((n, v), size) for n, v, size in cursor)
+
+    def resize(self, name, sizes):
+        """
+        Replaces recorded sizes of the images which are indexed already, other
+        versions are ignored
+
+        :param name: name of the repository
+        :type name: str
+        :param sizes: sizes of the images in bytes by their versions
+        :type sizes: dict
+        :return:
+        """
+        with self.connection as conn:
+            conn.executemany(
+                "UPDATE sizes SET bytes = ? WHERE name = ? AND version = ?",
+                [(size, name, version) for version, size in sizes.items()]
+            )
+
+    def totals(self):
+        """
+        Returns amount of versions and bytes of every repository ordered by name
+
+        :return: list of (name, versions, bytes)
+        """
+        return self.connection.execute(
+            "SELECT name, COUNT(*), SUM(bytes) FROM sizes GROUP BY name ORDER BY name"
+        ).fetchall()
+
+    def count(self, increments=None, values=None):
+        """
+        Adds increments to the counters and sets values of the gauges in a
+        single transaction
+
+        :param increments: amounts by (name, labels) of the counters
+        :type increments: dict
+        :param values: values by (name, labels) of the gauges
+        :type values: dict
+        :return:
+        """
+        with self.connection as conn:
+            for (name, labels), value in (increments or {}).items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO counters (name, labels, value) VALUES (?, ?, 0)", (name, labels)
+                )
+                conn.execute(
+                    "UPDATE counters SET value = value + ? WHERE name = ? AND labels = ?", (value, name, labels)
+                )
+            for (name, labels), value in (values or {}).items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO counters (name, labels, value) VALUES (?, ?, ?)", (name, labels, value)
+                )
+
+    def counters(self):
+        """
+        Returns values of the counters and gauges ordered by name
+
+        :return: list of (name, labels, value)
+        """
+        return self.connection.execute("SELECT name, labels, value FROM counters ORDER BY name, labels").fetchall()
+
+    def items(self):
+        """
+        Returns metadata of every indexed repository ordered by name, rows
+        are fetched and decoded one by one
+
+        :return: iterator of VMetadataImage
+        """
+        cursor = self.connection.execute("SELECT meta FROM repos ORDER BY name")
+
+        return (VCatalog.decode(row[0]) for row in cursor)
+
+    def export(self):
+        """
+        Returns JSON document of the root catalog, it is assembled from the
+        stored summaries without decoding metadata of the repositories
+
+        :return: str
+        """
+        cursor = self.connection.execute("SELECT summary FROM summaries ORDER BY name")
+
+        return '{{"repos":[{0}]}}\n'.format(",".join(row[0] for row in cursor))
+
+    def rebuild(self, items):
+        """
+        Replaces content of the catalog by given metadata, counters are kept
+
+        :param items: metadata, URL and sizes of the images of the repositories
+        :type items: collections.Iterable
+        :return:
+        """
+        with self.connection as conn:
+            conn.execute("DELETE FROM repos")
+            conn.execute("DELETE FROM summaries")
+            conn.execute("DELETE FROM sizes")
+            for meta, url, sizes in items:
+                VCatalog.insert(conn, meta, url, sizes)
+            conn.execute("PRAGMA user_version = {0:d}".format(VCatalog.VERSION))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class VChecksumCache:
+    """
+    Persistent cache of the file checksums keyed by device, inode, size and
+    modification time of the file, least recently used entries are evicted
+    """
+
+    FILENAME = "checksums.db"
+
+    # Time of the last use is refreshed on hits not more often than once per
+    # interval (in seconds), so hits do not write to the database
+    REFRESH_INTERVAL = 3600
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS checksums ("
+        "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, "
+        "checksum TEXT NOT NULL, used REAL NOT NULL, "
+        "PRIMARY KEY (dev, ino, size, mtime_ns))",
+        "CREATE INDEX IF NOT EXISTS checksums_used ON checksums (used)",
+    ]
+
+    @staticmethod
+    def key(st):
+        """
+        Returns cache key by given result of stat call
+
+        :param st: result of os.stat
+        :return: tuple
+        """
+        mtime_ns = getattr(st, 'st_mtime_ns', None)
+        if mtime_ns is None:
+            mtime_ns = int(st.st_mtime * 1000000000)
+
+        return st.st_dev, st.st_ino, st.st_size, mtime_ns
+
+    def __init__(self, path, size):
+        """
+        :param path: path to the cache database
+        :type path: str
+        :param size: maximum amount of entries in the cache
+        :type size: int
+        """
+        self.path = path
+        self.size = size
+        self.conn = None
+        self.lock = threading.RLock()
+
+    @property
+    def connection(self):
+        """
+        Returns connection to the cache, creating the database if needed,
+        the connection is shared between threads under the lock
+
+        :return: sqlite3.Connection
+        """
+        if self.conn is None:
+            path = os.path.dirname(self.path)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            for statement in VChecksumCache.SCHEMA:
+                self.conn.execute(statement)
+            self.conn.commit()
+
+        return self.conn
+
+    def get(self, path):
+        """
+        Returns cached checksum of the file or None if the file was changed
+        or was never hashed
+
+        :param path: path to the file
+        :type path: str
+        :return: str
+        """
+        key = VChecksumCache.key(os.stat(path))
+
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT checksum, used FROM checksums WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?", key
+                ).fetchone()
+
+                now = time.time()
+                if row and now - row[1] > VChecksumCache.REFRESH_INTERVAL:
+                    with self.connection as conn:
+                        conn.execute(
+                            "UPDATE checksums SET used = ? WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                            (now,) + key
+                        )
+        except (sqlite3.Error, OSError, IOError):
+            return None
+
+        return row[0] if row else None
+
+    def put(self, st, checksum):
+        """
+        Saves checksum of the file and evicts least recently used entries
+
+        :param st: result of os.stat of the hashed file
+        :param checksum: checksum hex digit string
+        :type checksum: str
+        :return:
+        """
+        try:
+            with self.lock, self.connection as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checksums (dev, ino, size, mtime_ns, checksum, used) VALUES (?, ?, ?, ?, ?, ?)",
+                    VChecksumCache.key(st) + (checksum, time.time())
+                )
+                conn.execute(
+                    "DELETE FROM checksums WHERE rowid IN "
+                    "(SELECT rowid FROM checksums ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                    (self.size,)
+                )
+        except (sqlite3.Error, OSError, IOError):
+            print("Error: unable to update checksum cache {0}".format(self.path))
+
+    def checksum(self, path, func):
+        """
+        Returns checksum of the file from the cache or computes it by given function
+
+        :param path: path to the file
+        :type path: str
+        :param func: function which computes checksum by given path
+        :return: str
+        """
+        checksum = self.get(path)
+        if checksum:
+            return checksum
+
+        before = os.stat(path)
+        checksum = func(path)
+
+        # Do not remember checksum of the file which was changed while hashing
+        if VChecksumCache.key(before) == VChecksumCache.key(os.stat(path)):
+            self.put(before, checksum)
+
+        return checksum
@@ -5,13 +5,15 @@
 
 import sys
 
-from .repository import VImageVersionFoundError
-from .storage import VStorage
 from .usage import VCLIUsage
 
 from clint.arguments import Args
 from clint.textui import colored, puts, min_width
 
+# Modules which are needed by particular commands only (storage, YAML, packaging,
+# multiprocessing, gzip) are imported inside of the commands or of the functions which
+# use them to keep start of the CLI fast, see benchmarks/bench_startup.py.
+
 ####################################################################################################
 
 
@@ -23,6 +25,11 @@ class VCLIApplication:
 
     COLUMN_WIDTH = 16
 
+    LIST_FIELDS = ('name', 'version', 'provider', 'url', 'box_url', 'checksum_type', 'checksum')
+
+    # Commands which change the storage, metrics file is written after them
+    MUTATING_COMMANDS = ('add', 'remove', 'reindex', 'prune')
+
     @staticmethod
     def success(msg="OK"):
         """
@@ -72,22 +79,68 @@ class VCLIApplication:
             VCLIApplication.print_column(f['name'], f['width'])
         puts()
 
+    def timings_format(self):
+        """
+        Returns format of timings requested by --profile (text) or
+        --timings=json, None if timings are not requested
+
+        :return: str
+        """
+        if self.cli.contains('--profile'):
+            return 'text'
+
+        for arg in self.cli.all:
+            if arg.startswith('--timings='):
+                return arg.split('=', 1)[1] or 'text'
+
+        if self.cli.contains('--timings'):
+            return self.cli.value_after('--timings') or 'text'
+
+        return None
+
+    @staticmethod
+    def print_timings(fmt):
+        """
+        Displays totals of the measured operations to stderr, so they do not
+        mix with the output of the command
+
+        :param fmt: text or json
+        :type fmt: str
+        :return:
+        """
+        from .timings import VTimings
+
+        if fmt == 'json':
+            import json
+            sys.stderr.write(json.dumps(VTimings.summary(), sort_keys=True) + "\n")
+        else:
+            sys.stderr.write("\n".join(VTimings.report()) + "\n")
+
     def process(self):
         """
         Handles arguments and execute commands
 
         :return:
         """
-        if self.cli.contains(['h', 'help']):
-            self.help_command()
-        elif self.cli.contains(['a', 'add']):
-            self.add_command()
-        elif self.cli.contains(['l', 'list']):
-            self.list_command()
-        elif self.cli.contains(['r', 'remove']):
-            self.remove_command()
-        else:
-            self.help_command()
+        commands = [
+            (['h', 'help'], 'help', self.help_command),
+            (['a', 'add'], 'add', self.add_command),
+            (['l', 'list'], 'list', self.list_command),
+            (['r', 'remove'], 'remove', self.remove_command),
+            (['reindex'], 'reindex', self.reindex_command),
+            (['verify'], 'verify', self.verify_command),
+            (['prune'], 'prune', self.prune_command),
+            (['serve'], 'serve', self.serve_command),
+            (['metrics'], 'metrics', self.metrics_command),
+            (['du'], 'du', self.du_command),
+        ]
+
+        for aliases, name, command in commands:
+            if self.cli.contains(aliases):
+                self.command = name
+                return command()
+
+        self.help_command()
 
     def __init__(self, cnf):
         """
@@ -96,9 +149,63 @@ class VCLIApplication:
         :param cnf: path to configuration file
         :type cnf: str
         """
-        self.storage = VStorage(cnf)
+        self.cnf = cnf
+        self.command = None
+        self._storage = None
         self.cli = Args()
-        self.process()
+
+        timings = self.timings_format()
+        if timings:
+            from .timings import VTimings
+            VTimings.enable()
+
+        failed = True
+        try:
+            self.process()
+            failed = False
+        except SystemExit as e:
+            failed = e.code not in (None, 0)
+            raise
+        finally:
+            # Storage is initialized by commands which reached it only
+            if self.command in self.MUTATING_COMMANDS and self._storage is not None:
+                self.export_metrics(failed)
+            if timings:
+                self.print_timings(timings)
+
+    def export_metrics(self, failed):
+        """
+        Writes metrics file after the command, failure of the metrics does not
+        change result of the command
+
+        :param failed: is the command failed or not
+        :type failed: bool
+        :return:
+        """
+        import sqlite3
+
+        try:
+            self.storage.export_metrics(error=self.command if failed else None)
+        except (IOError, OSError, sqlite3.Error) as e:
+            puts(colored.yellow("Warning: unable to update metrics: {0}".format(e)), stream=sys.stderr.write)
+
+    @property
+    def storage(self):
+        """
+        Returns storage initialized by the configuration file on the first use
+
+        :return: VStorage
+        """
+        if self._storage is None:
+            from .settings import VSettingsError
+            from .storage import VStorage
+
+            try:
+                self._storage = VStorage(self.cnf)
+            except VSettingsError as e:
+                self.error("Error: invalid configuration {0}: {1}".format(self.cnf, e.msg))
+
+        return self._storage
 
     def add_command(self):
         """
@@ -106,43 +213,149 @@ class VCLIApplication:
 
         :return:
         """
+        import re
+        from .meta.versions import VVersionIndex
+        from .repository import VImageVersionFoundError
+
+        manifest = self.cli.value_after('-m') or self.cli.value_after('--manifest')
+        if manifest:
+            return self.add_batch_command(manifest)
+
         args = {
             'src': self.cli.files[0] if self.cli.files and len(self.cli.files) > 0 else None,
             'name': self.cli.value_after('-n') or self.cli.value_after('--name'),
             'version': self.cli.value_after('-v') or self.cli.value_after('--version'),
             'desc': self.cli.value_after('-d') or self.cli.value_after('--desc'),
-            'provider': self.cli.value_after('-p') or self.cli.value_after('--provider')
+            'provider': self.cli.value_after('-p') or self.cli.value_after('--provider'),
+            'mode': 'move' if self.cli.contains('--move') else 'link' if self.cli.contains('--link') else 'copy',
+            'size': self.cli.value_after('--size'),
+            'checksum': self.cli.value_after('--sha256'),
         }
 
+        # Dash reads the image from the standard input (e.g. pipe)
+        if not args['src'] and '-' in self.cli.all:
+            if not args['name']:
+                self.error("Error: name is required when the image is read from stdin")
+            args['src'] = getattr(sys.stdin, 'buffer', sys.stdin)
+            if args['mode'] != 'copy':
+                self.error("Error: --link and --move require a file")
+
         if not args['src']:
             self.error("Error: source is not specified")
 
         if not args['version']:
             self.error("Error: version is not specified")
 
+        if not VVersionIndex.is_valid(args['version']):
+            self.error("Error: invalid version {0}".format(args['version']))
+
+        if args['size'] is not None:
+            if not args['size'].isdigit():
+                self.error("Error: invalid size {0}".format(args['size']))
+            args['size'] = int(args['size'])
+
+        if args['checksum'] is not None and not re.match(r'^[0-9a-fA-F]{64}$', args['checksum']):
+            self.error("Error: invalid SHA256 checksum {0}".format(args['checksum']))
+
         try:
-            self.storage.add(
+            ingests = self.storage.add(
                 src=args['src'],
                 name=args['name'],
                 version=args['version'],
                 desc=args['desc'],
                 provider=args['provider'],
+                mode=args['mode'],
+                size=args['size'],
+                checksum=args['checksum'],
             )
         except VImageVersionFoundError:
             self.error("Error: version is already exists")
         else:
+            if not ingests:
+                self.error()
+
+            for ingest in ingests:
+                for line in ingest.report():
+                    puts(line)
+            self.success()
+
+    def add_batch_command(self, manifest):
+        """
+        Adds images listed in the manifest file to the storage
+
+        :param manifest: path to the manifest file
+        :type manifest: str
+        :return:
+        """
+        from .batch import VManifest
+        from .meta.versions import VVersionIndex
+        from .repository import VImageNotFound, VImageVersionFoundError
+
+        try:
+            entries = VManifest.read(manifest)
+        except (IOError, OSError, ValueError) as e:
+            self.error("Error: unable to read manifest: {0}".format(e))
+
+        for e in entries:
+            if not VVersionIndex.is_valid(e.version):
+                self.error("Error: invalid version {0} of {1}".format(e.version, e.name))
+
+        try:
+            results = self.storage.add_batch(entries)
+        except (IOError, OSError, ValueError) as e:
+            self.error("Error: unable to read manifest: {0}".format(e))
+        except VImageNotFound as e:
+            self.error("Error: image {0} is not found".format(e.path))
+        except VImageVersionFoundError as e:
+            self.error("Error: version {0} of {1} is already exists".format(e.version, e.name))
+        else:
+            failed = 0
+            for entry, ingest in results:
+                if ingest is None:
+                    failed += 1
+                    puts(colored.red("{0} {1}: FAIL".format(entry.name, entry.version)))
+                    continue
+
+                puts("{0} {1}:".format(entry.name, entry.version))
+                for line in ingest.report():
+                    puts("    {0}".format(line))
+
+            if failed:
+                self.error()
             self.success()
 
     def list_command(self):
         """
-        Displays list of available repositories and images inside of them
+        Displays list of available repositories and images inside of them,
+        rows are printed as soon as they are read from the storage
 
         :return:
         """
         args = {
-            'name': self.cli.value_after('-n') or self.cli.value_after('--name')
+            'name': self.cli.value_after('-n') or self.cli.value_after('--name'),
+            'format': self.cli.value_after('-f') or self.cli.value_after('--format') or 'table',
         }
 
+        formats = {
+            'table': self.print_table,
+            'tsv': self.print_tsv,
+            'ndjson': self.print_ndjson,
+            'json': self.print_json,
+        }
+
+        if args['format'] not in formats:
+            self.error("Error: unknown format {0}".format(args['format']))
+
+        formats[args['format']](self.storage.rows(args['name']))
+
+    def print_table(self, rows):
+        """
+        Displays rows as a table with colored header
+
+        :param rows: rows of the list
+        :type rows: collections.Iterable
+        :return:
+        """
         self.print_row([
             {'name': colored.yellow("NAME"), 'width': self.COLUMN_WIDTH},
             {'name': colored.yellow("VERSION"), 'width': self.COLUMN_WIDTH},
@@ -150,18 +363,64 @@ class VCLIApplication:
             {'name': colored.yellow("URL"), 'width': self.COLUMN_WIDTH * 4},
         ])
 
-        for repo in self.storage.list(args['name']):
-            meta = repo.info
+        for row in rows:
+            self.print_row([
+                {'name': row['name'], 'width': self.COLUMN_WIDTH},
+                {'name': row['version'], 'width': self.COLUMN_WIDTH},
+                {'name': row['provider'], 'width': self.COLUMN_WIDTH},
+                {'name': row['url'], 'width': self.COLUMN_WIDTH * 4},
+            ])
+
+    @staticmethod
+    def print_tsv(rows):
+        """
+        Displays rows as tab-separated values with a header line
+
+        :param rows: rows of the list
+        :type rows: collections.Iterable
+        :return:
+        """
+        fields = VCLIApplication.LIST_FIELDS
 
-            for version in meta.versions:
-                for provider in version.providers:
+        sys.stdout.write("\t".join(fields) + "\n")
+        for row in rows:
+            sys.stdout.write("\t".join(str(row[f] or "") for f in fields) + "\n")
+            sys.stdout.flush()
 
-                    self.print_row([
-                        {'name': meta.name, 'width': self.COLUMN_WIDTH},
-                        {'name': version.version, 'width': self.COLUMN_WIDTH},
-                        {'name': provider.name, 'width': self.COLUMN_WIDTH},
-                        {'name': repo.repo_url, 'width': self.COLUMN_WIDTH * 4},
-                    ])
+    @staticmethod
+    def print_ndjson(rows):
+        """
+        Displays rows as newline-delimited JSON objects
+
+        :param rows: rows of the list
+        :type rows: collections.Iterable
+        :return:
+        """
+        import json
+
+        for row in rows:
+            sys.stdout.write(json.dumps(row, sort_keys=True) + "\n")
+            sys.stdout.flush()
+
+    @staticmethod
+    def print_json(rows):
+        """
+        Displays rows as JSON array which is written element by element
+
+        :param rows: rows of the list
+        :type rows: collections.Iterable
+        :return:
+        """
+        import json
+
+        separator = "\n"
+
+        sys.stdout.write("[")
+        for row in rows:
+            sys.stdout.write(separator + json.dumps(row, sort_keys=True))
+            sys.stdout.flush()
+            separator = ",\n"
+        sys.stdout.write("\n]\n" if separator != "\n" else "]\n")
 
     def remove_command(self):
         """
@@ -190,6 +449,272 @@ class VCLIApplication:
         else:
             self.success()
 
+    def reindex_command(self):
+        """
+        Rebuilds catalog of the storage from the metadata of every repository
+
+        :return:
+        """
+        import sqlite3
+
+        try:
+            count = self.storage.reindex()
+        except (IOError, OSError, sqlite3.Error):
+            self.error("Error: unable to rebuild catalog")
+        else:
+            self.success("OK: {0} repositories indexed".format(count))
+
+    def verify_command(self):
+        """
+        Checks images on the disk against checksums saved in the metadata
+
+        :return:
+        """
+        from .utils import parse_timestamp
+
+        args = {
+            'repo': self.cli.value_after('--repo'),
+            'since': self.cli.value_after('--since'),
+        }
+
+        try:
+            since = parse_timestamp(args['since']) if args['since'] else None
+        except ValueError as e:
+            self.error("Error: {0}".format(e))
+
+        verifier = self.storage.verify(name=args['repo'], since=since)
+
+        for result in verifier.run():
+            if result.ok:
+                status = colored.green("OK")
+            else:
+                status = colored.red(result.error and "ERROR" or "MISMATCH")
+
+            self.print_row([
+                {'name': status, 'width': self.COLUMN_WIDTH},
+                {'name': result.name, 'width': self.COLUMN_WIDTH},
+                {'name': result.version, 'width': self.COLUMN_WIDTH},
+                {'name': "{0:.1f} MB/s".format(result.rate / 1048576.0), 'width': self.COLUMN_WIDTH},
+            ])
+
+        puts(str(verifier.summary))
+
+        if verifier.summary.failed:
+            self.error()
+        self.success()
+
+    def prune_command(self):
+        """
+        Removes versions which are not kept by retention rules
+
+        :return:
+        """
+        from .prune import VRetentionPolicy
+        from .utils import parse_timestamp
+
+        args = {
+            'repo': self.cli.value_after('--repo'),
+            'keep': self.cli.value_after('--keep'),
+            'newer': self.cli.value_after('--newer-than'),
+            'match': self.cli.value_after('--match'),
+            'dry_run': self.cli.contains('--dry-run'),
+        }
+
+        try:
+            policy = VRetentionPolicy(
+                keep=int(args['keep']) if args['keep'] is not None else None,
+                newer=parse_timestamp(args['newer']) if args['newer'] else None,
+                specifier=args['match'],
+            )
+        except ValueError as e:
+            self.error("Error: {0}".format(e))
+
+        status = colored.yellow("DRY RUN") if args['dry_run'] else colored.green("REMOVED")
+        failed = 0
+
+        for name, pruned in self.storage.prune(policy, name=args['repo'], dry_run=args['dry_run']):
+            if pruned is None:
+                failed += 1
+                puts(colored.red("{0}: FAIL".format(name)))
+                continue
+
+            for v in pruned:
+                self.print_row([
+                    {'name': status, 'width': self.COLUMN_WIDTH},
+                    {'name': name, 'width': self.COLUMN_WIDTH},
+                    {'name': v.version, 'width': self.COLUMN_WIDTH},
+                ])
+
+        if failed:
+            self.error()
+        self.success()
+
+    def metrics_command(self):
+        """
+        Writes metrics file of the storage or displays metrics with --output -
+
+        :return:
+        """
+        import sqlite3
+        from .metrics import VMetrics
+
+        output = self.cli.value_after('-o') or self.cli.value_after('--output')
+
+        try:
+            if output == '-':
+                sys.stdout.write(VMetrics(self.storage.catalog).render())
+                return
+            with self.storage.lock():
+                written = VMetrics(self.storage.catalog).write(output or self.storage.settings.metrics_path)
+        except (IOError, OSError, sqlite3.Error):
+            self.error("Error: unable to read catalog")
+        else:
+            if not written:
+                self.error()
+            self.success("OK: metrics written to {0}".format(output or self.storage.settings.metrics_path))
+
+    def du_command(self):
+        """
+        Displays disk usage of the repositories and their versions, the
+        largest repositories first
+
+        :return:
+        """
+        import json
+        import sqlite3
+        from .utils import format_size
+
+        args = {
+            'repo': self.cli.value_after('--repo'),
+            'format': self.cli.value_after('-f') or self.cli.value_after('--format') or 'table',
+            'rescan': self.cli.contains('--rescan'),
+        }
+
+        if args['format'] not in ('table', 'json'):
+            self.error("Error: unknown format {0}".format(args['format']))
+
+        changes = []
+
+        try:
+            if args['rescan']:
+                changes = self.storage.rescan(args['repo'])
+                self.storage.export_metrics()
+
+            repos = {}
+            for row in self.storage.usage(args['repo']):
+                repos.setdefault(row['name'], []).append(row)
+        except (IOError, OSError, sqlite3.Error):
+            self.error("Error: unable to read catalog")
+
+        totals = sorted(((sum(r['bytes'] for r in rows), name) for name, rows in repos.items()), reverse=True)
+
+        if args['format'] == 'json':
+            sys.stdout.write(json.dumps({
+                'bytes': sum(size for size, _ in totals),
+                'repos': [{
+                    'name': name,
+                    'bytes': size,
+                    'versions': [dict((k, r[k]) for k in ('version', 'providers', 'bytes')) for r in repos[name]],
+                } for size, name in totals],
+                'corrections': [{
+                    'name': name,
+                    'version': version,
+                    'recorded': recorded,
+                    'bytes': actual,
+                } for name, version, recorded, actual in changes],
+            }, indent=4, sort_keys=True) + "\n")
+            return
+
+        for name, version, recorded, actual in changes:
+            puts(colored.yellow("{0} {1}: {2} -> {3}".format(
+                name, version, format_size(recorded), format_size(actual)
+            )))
+
+        self.print_row([
+            {'name': colored.yellow("NAME"), 'width': self.COLUMN_WIDTH},
+            {'name': colored.yellow("VERSION"), 'width': self.COLUMN_WIDTH},
+            {'name': colored.yellow("PROVIDER"), 'width': self.COLUMN_WIDTH * 2},
+            {'name': colored.yellow("SIZE"), 'width': self.COLUMN_WIDTH},
+        ])
+
+        for _, name in totals:
+            for r in sorted(repos[name], key=lambda r: -r['bytes']):
+                self.print_row([
+                    {'name': name, 'width': self.COLUMN_WIDTH},
+                    {'name': r['version'], 'width': self.COLUMN_WIDTH},
+                    {'name': ",".join(r['providers']), 'width': self.COLUMN_WIDTH * 2},
+                    {'name': format_size(r['bytes']), 'width': self.COLUMN_WIDTH},
+                ])
+            self.print_row([
+                {'name': colored.green(name), 'width': self.COLUMN_WIDTH},
+                {'name': colored.green("total"), 'width': self.COLUMN_WIDTH * 3},
+                {'name': colored.green(format_size(sum(r['bytes'] for r in repos[name]))), 'width': self.COLUMN_WIDTH},
+            ])
+
+        self.print_row([
+            {'name': colored.green("TOTAL"), 'width': self.COLUMN_WIDTH * 4},
+            {'name': colored.green(format_size(sum(size for size, _ in totals))), 'width': self.COLUMN_WIDTH},
+        ])
+
+    def serve_command(self):
+        """
+        Serves metadata and images of the storage over HTTP
+
+        :return:
+        """
+        from .server import VServer
+
+        if self.cli.contains('--metadata-only'):
+            return self.serve_metadata_command()
+
+        try:
+            address = VServer.address(self.storage.settings, self.cli.value_after('--listen'))
+            server = VServer(address, self.storage.settings, verbose=self.cli.contains('--verbose'))
+        except (ValueError, OSError, IOError) as e:
+            self.error("Error: unable to listen: {0}".format(e))
+
+        puts("Serving {0} on {1}:{2}".format(self.storage.settings.storage_path, address[0] or '*', address[1]))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def serve_metadata_command(self):
+        """
+        Serves metadata of the repositories from memory by the asyncio server
+
+        :return:
+        """
+        from .server import VServer
+
+        try:
+            from .metaserver import VMetadataService
+        except ImportError:
+            self.error("Error: metadata server requires Python 3")
+
+        watcher = self.cli.value_after('--watch') or 'auto'
+        if watcher not in ('auto', 'inotify', 'poll'):
+            self.error("Error: unknown watcher {0}".format(watcher))
+
+        try:
+            address = VServer.address(self.storage.settings, self.cli.value_after('--listen'))
+            service = VMetadataService(self.storage.settings, watcher=watcher)
+        except (ValueError, OSError, IOError) as e:
+            self.error("Error: unable to start metadata server: {0}".format(e))
+
+        puts("Serving metadata of {0} on {1}:{2} ({3})".format(
+            self.storage.settings.storage_path, address[0] or '*', address[1], service.watcher.name))
+
+        try:
+            service.run(address)
+        except KeyboardInterrupt:
+            pass
+        except (OSError, IOError) as e:
+            self.error("Error: unable to listen: {0}".format(e))
+
     @staticmethod
     def help_command():
         """
@@ -202,15 +727,53 @@ class VCLIApplication:
         usage.add_command(cmd="a:add", desc="Add image into the Vagrant's repository")
         usage.add_command(cmd="l:list", desc="Show list of available images")
         usage.add_command(cmd="r:remove", desc="Remove image from the repository")
+        usage.add_command(cmd="reindex", desc="Rebuild catalog of the storage")
+        usage.add_command(cmd="verify", desc="Check images against their checksums")
+        usage.add_command(cmd="prune", desc="Remove versions which are not kept by retention rules")
+        usage.add_command(cmd="serve", desc="Serve repositories over HTTP")
+        usage.add_command(cmd="du", desc="Show disk usage of repositories and versions")
+        usage.add_command(cmd="metrics", desc="Write metrics file for the node_exporter textfile collector")
         usage.add_command(cmd="h:help", desc="Display current help message")
 
         usage.add_option(option="v:version", desc="Value of version of the box")
         usage.add_option(option="n:name", desc="Name of box in the repository")
         usage.add_option(option="d:desc", desc="Description of the box in the repository")
         usage.add_option(option="p:provider", desc="Name of provider (e.g. virtualbox)")
+        usage.add_option(option="m:manifest", desc="Add images listed in YAML, JSON or NDJSON file")
+        usage.add_option(option="link", desc="Hard link the box into the repository instead of copying")
+        usage.add_option(option="move", desc="Move the box into the repository instead of copying")
+        usage.add_option(option="size", desc="Expected size of the box in bytes, e.g. for stdin")
+        usage.add_option(option="sha256", desc="Expected SHA256 checksum of the box, e.g. for stdin")
+        usage.add_option(option="f:format", desc="Output format of list: table, json, ndjson or tsv (du: table or json)")
+        usage.add_option(option="repo", desc="Name of repository to verify, prune or show usage")
+        usage.add_option(option="since", desc="Verify images changed since date or age (e.g. 7d)")
+        usage.add_option(option="keep", desc="Amount of the latest versions kept by prune")
+        usage.add_option(option="newer-than", desc="Keep images added since date or age (e.g. 30d)")
+        usage.add_option(option="match", desc="Keep versions matching specifier (e.g. '>=2.0')")
+        usage.add_option(option="dry-run", desc="Show versions which would be pruned")
+        usage.add_option(option="listen", desc="Address of the server (default is the port of storage URL)")
+        usage.add_option(option="verbose", desc="Log every request of the server")
+        usage.add_option(option="metadata-only", desc="Serve metadata from memory by the asyncio server")
+        usage.add_option(option="watch", desc="Refresh metadata by inotify or poll (default is auto)")
+        usage.add_option(option="rescan", desc="Reconcile recorded sizes of images with the disk before du")
+        usage.add_option(option="o:output", desc="Path to the metrics file or - for stdout")
+        usage.add_option(option="profile", desc="Show time spent in hashing, copying and metadata I/O")
+        usage.add_option(option="timings", desc="Format of --profile output: text or json (e.g. --timings=json)")
 
         usage.add_example("{app} add image.box --name box --version 1.0.1".format(app=VCLIApplication.APP))
+        usage.add_example("{app} add image.box --name box --version 1.0.2 --move".format(app=VCLIApplication.APP))
+        usage.add_example("cat image.box | {app} add - --name box --version 1.0.3 --sha256 <checksum>".format(
+            app=VCLIApplication.APP
+        ))
+        usage.add_example("{app} add --manifest release.yml".format(app=VCLIApplication.APP))
         usage.add_example("{app} remove powerbox --version 1.1.0".format(app=VCLIApplication.APP))
         usage.add_example("{app} list".format(app=VCLIApplication.APP))
+        usage.add_example("{app} list --format ndjson".format(app=VCLIApplication.APP))
+        usage.add_example("{app} verify --since 1d".format(app=VCLIApplication.APP))
+        usage.add_example("{app} prune --keep 5 --newer-than 30d --dry-run".format(app=VCLIApplication.APP))
+        usage.add_example("{app} add image.box --name box --version 1.0.4 --profile".format(app=VCLIApplication.APP))
+        usage.add_example("{app} du --repo powerbox --rescan".format(app=VCLIApplication.APP))
+        usage.add_example("{app} metrics --output -".format(app=VCLIApplication.APP))
+        usage.add_example("{app} serve --listen 127.0.0.1:8080".format(app=VCLIApplication.APP))
 
         usage.render()
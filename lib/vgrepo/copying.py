@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import errno
+import os
+import shutil
+
+from .utils import timer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request to clone file extents (linux/fs.h), supported by btrfs and XFS with reflink
+FICLONE = 0x40049409
+
+# Errors which mean that the strategy is not supported for given files
+UNSUPPORTED = frozenset(filter(None, [
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EBADF,
+    getattr(errno, 'EOPNOTSUPP', None), getattr(errno, 'ENOTSUP', None),
+]))
+
+
+class VCopyEngine:
+    """
+    Copies file with the fastest strategy supported by the platform and the
+    filesystem: reflink clone, copy_file_range, sendfile and then buffered copy
+    """
+
+    STRATEGIES = ('reflink', 'copy_file_range', 'sendfile', 'buffered')
+
+    BUFFER_SIZE = 1048576
+
+    # Maximum amount of bytes per system call
+    CHUNK_SIZE = 1073741824
+
+    def __init__(self, src, dst, strategies=None):
+        """
+        :param src: path to the original file
+        :type src: str
+        :param dst: path to the copy
+        :type dst: str
+        :param strategies: strategies to try in order (optional)
+        :type strategies: collections.Iterable
+        """
+        self.src = src
+        self.dst = dst
+        self.strategies = strategies or VCopyEngine.STRATEGIES
+        self.strategy = None
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        """
+        Returns throughput of the copy in bytes per second
+
+        :return: float
+        """
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return "copy ({strategy}): {size:.1f} MB in {seconds:.2f}s ({rate:.1f} MB/s)".format(
+            strategy=self.strategy,
+            size=self.bytes / 1048576.0,
+            seconds=self.seconds,
+            rate=self.rate / 1048576.0,
+        )
+
+    @staticmethod
+    def truncated(src):
+        """
+        Returns error of the copy which is shorter than the source
+
+        :param src: source file object
+        :return: IOError
+        """
+        return IOError(errno.EIO, "{0} was changed while copying".format(src.name))
+
+    @staticmethod
+    def copy_reflink(src, dst, size):
+        if fcntl is None:
+            return False
+
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+
+    @staticmethod
+    def copy_copy_file_range(src, dst, size):
+        if not hasattr(os, 'copy_file_range'):
+            return False
+
+        copied = 0
+        while copied < size:
+            n = os.copy_file_range(src.fileno(), dst.fileno(), min(VCopyEngine.CHUNK_SIZE, size - copied))
+            if n == 0:
+                raise VCopyEngine.truncated(src)
+            copied += n
+
+        return True
+
+    @staticmethod
+    def copy_sendfile(src, dst, size):
+        if not hasattr(os, 'sendfile'):
+            return False
+
+        copied = 0
+        while copied < size:
+            n = os.sendfile(dst.fileno(), src.fileno(), copied, min(VCopyEngine.CHUNK_SIZE, size - copied))
+            if n == 0:
+                raise VCopyEngine.truncated(src)
+            copied += n
+
+        return True
+
+    @staticmethod
+    def copy_buffered(src, dst, size):
+        shutil.copyfileobj(src, dst, VCopyEngine.BUFFER_SIZE)
+        return True
+
+    def run(self):
+        """
+        Copies the file by the first strategy which works, strategy stays None
+        if none of given strategies is supported
+
+        :return: self
+        """
+        started = timer()
+
+        with open(self.src, 'rb') as src, open(self.dst, 'wb') as dst:
+            size = os.fstat(src.fileno()).st_size
+
+            for strategy in self.strategies:
+                try:
+                    if getattr(self, 'copy_' + strategy)(src, dst, size):
+                        self.strategy = strategy
+                        break
+                except (OSError, IOError) as e:
+                    if e.errno not in UNSUPPORTED:
+                        raise
+
+                # Start from scratch with the next strategy
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+
+            # Short copy must not be published under the checksum of the source
+            if self.strategy and os.fstat(dst.fileno()).st_size != size:
+                raise VCopyEngine.truncated(src)
+
+        self.seconds = timer() - started
+
+        if self.strategy:
+            shutil.copystat(self.src, self.dst)
+            self.bytes = os.stat(self.dst).st_size
+
+        return self
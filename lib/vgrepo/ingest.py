@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import errno
+import hashlib
+import os
+import shutil
+
+from .copying import VCopyEngine
+from .timings import VTimings
+from .utils import timer
+
+
+class VIngestPhase:
+    """
+    Accumulates amount of bytes and time spent in one phase of the ingest
+    """
+
+    def __init__(self, name):
+        """
+        :param name: name of the phase (e.g. read, hash, write)
+        :type name: str
+        """
+        self.name = name
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        """
+        Returns throughput of the phase in bytes per second
+
+        :return: float
+        """
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return "{name}: {size:.1f} MB in {seconds:.2f}s ({rate:.1f} MB/s)".format(
+            name=self.name,
+            size=self.bytes / 1048576.0,
+            seconds=self.seconds,
+            rate=self.rate / 1048576.0,
+        )
+
+
+class VIngestPipeline:
+    """
+    Places copy of the source image into the repository with the cheapest
+    strategy and computes its checksum, reading the data at most once
+    """
+
+    BUFFER_SIZE = 1048576
+
+    # Errors of hard linking which mean that the image should be copied instead
+    LINK_ERRORS = frozenset(filter(None, [
+        errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EACCES,
+        getattr(errno, 'EOPNOTSUPP', None), getattr(errno, 'ENOTSUP', None),
+    ]))
+
+    def __init__(self, src, dst, buffer_size=None, checksum=None, link=False):
+        """
+        :param src: path to the original image file or readable binary stream
+        :type src: str
+        :param dst: path to the image file in the repository
+        :type dst: str
+        :param buffer_size: size of the read buffer in bytes
+        :type buffer_size: int
+        :param checksum: already known checksum of the source, skips hashing
+        :type checksum: str
+        :param link: hard link the source instead of copying if possible
+        :type link: bool
+        """
+        self.src = src
+        self.dst = dst
+        self.buffer_size = buffer_size or VIngestPipeline.BUFFER_SIZE
+        self.checksum = checksum
+        self.link = link
+        self.strategy = None
+
+        self.phases = []
+
+    def run(self):
+        """
+        Places the image and reports its phases to the timings
+
+        :return: self
+        """
+        self.transfer()
+
+        if VTimings.active:
+            for phase in self.phases:
+                if phase.bytes or phase.seconds:
+                    VTimings.record(phase.name.split(' ')[0], phase.seconds, phase.bytes)
+
+        return self
+
+    def transfer(self):
+        """
+        Copies image and computes SHA256 checksum. Reflink clone shares data
+        with the source, so only the clone is read to hash it. Kernel copies
+        are used when the checksum is already known, otherwise the image is
+        copied and hashed from the same buffers in a single pass.
+
+        Hard linked image is hashed in place, streams are always copied and
+        hashed in a single pass.
+
+        :return: self
+        """
+        if hasattr(self.src, 'read'):
+            self.strategy = 'stream'
+            self.phases = [VIngestPhase('read'), VIngestPhase('hash'), VIngestPhase('write')]
+            self.stream(self.src, *self.phases)
+            return self
+
+        if self.link and self.hardlink():
+            return self
+
+        if self.checksum:
+            strategies = [s for s in VCopyEngine.STRATEGIES if s != 'buffered']
+        else:
+            strategies = ['reflink']
+
+        engine = VCopyEngine(self.src, self.dst, strategies=strategies).run()
+
+        if engine.strategy is None:
+            self.strategy = 'buffered'
+            self.phases = [VIngestPhase('read'), VIngestPhase('hash'), VIngestPhase('write')]
+            self.stream(self.src, *self.phases)
+            shutil.copystat(self.src, self.dst)
+            return self
+
+        self.strategy = engine.strategy
+
+        copy = VIngestPhase("copy ({0})".format(engine.strategy))
+        copy.bytes = engine.bytes
+        copy.seconds = engine.seconds
+        self.phases = [copy]
+
+        if not self.checksum:
+            self.phases += [VIngestPhase('read'), VIngestPhase('hash')]
+            self.stream(self.dst, *self.phases[1:])
+
+        return self
+
+    def hardlink(self):
+        """
+        Links the source to the destination, returns False if the files are
+        on different devices or the filesystem does not support hard links
+
+        :return: bool
+        """
+        started = timer()
+
+        try:
+            if os.path.lexists(self.dst):
+                os.remove(self.dst)
+            os.link(self.src, self.dst)
+        except (OSError, IOError) as e:
+            if e.errno not in VIngestPipeline.LINK_ERRORS:
+                raise
+            return False
+
+        self.strategy = 'link'
+
+        link = VIngestPhase('link')
+        link.bytes = os.stat(self.dst).st_size
+        link.seconds = timer() - started
+        self.phases = [link]
+
+        if not self.checksum:
+            self.phases += [VIngestPhase('read'), VIngestPhase('hash')]
+            self.stream(self.dst, *self.phases[1:])
+
+        return True
+
+    def stream(self, path, read, digest, write=None):
+        """
+        Reads the file once, updates the digest and writes the same buffers to
+        the destination if the write phase is given
+
+        :param path: path to the read file or opened binary stream
+        :type path: str
+        :param read: statistics of reading
+        :type read: VIngestPhase
+        :param digest: statistics of hashing
+        :type digest: VIngestPhase
+        :param write: statistics of writing (optional)
+        :type write: VIngestPhase
+        :return:
+        """
+        sha256 = None if self.checksum else hashlib.sha256()
+        buf = bytearray(self.buffer_size)
+        view = memoryview(buf)
+        src = path if hasattr(path, 'read') else open(path, 'rb')
+        dst = None
+
+        try:
+            if write is not None:
+                dst = open(self.dst, 'wb')
+
+            while True:
+                started = timer()
+                size = VIngestPipeline.read_into(src, buf)
+                read.seconds += timer() - started
+                if not size:
+                    break
+                read.bytes += size
+
+                chunk = view[:size]
+
+                if sha256 is not None:
+                    started = timer()
+                    sha256.update(chunk)
+                    digest.seconds += timer() - started
+                    digest.bytes += size
+
+                if dst is not None:
+                    started = timer()
+                    dst.write(chunk)
+                    write.seconds += timer() - started
+                    write.bytes += size
+        finally:
+            if src is not path:
+                src.close()
+            if dst is not None:
+                dst.close()
+
+        if sha256 is not None:
+            self.checksum = sha256.hexdigest()
+
+    @staticmethod
+    def read_into(src, buf):
+        """
+        Fills the buffer from the file or stream, streams without readinto
+        (e.g. sockets wrapped by other libraries) are read by copy
+
+        :param src: opened binary file or stream
+        :param buf: buffer to fill
+        :type buf: bytearray
+        :return: amount of read bytes
+        """
+        if hasattr(src, 'readinto'):
+            return src.readinto(buf)
+
+        data = src.read(len(buf))
+        buf[:len(data)] = data
+
+        return len(data)
+
+    def report(self):
+        """
+        Returns human-readable lines with statistics of every phase
+
+        :return: list
+        """
+        return [str(phase) for phase in self.phases]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class VLock:
+    """
+    Exclusive advisory lock on the file. The lock is reentrant within a thread
+    and excludes other threads and processes. Locking is not performed on
+    platforms without fcntl.
+    """
+
+    local = threading.local()
+
+    def __init__(self, path):
+        """
+        :param path: path to the lock file
+        :type path: str
+        """
+        self.path = path
+
+    @property
+    def held(self):
+        """
+        Returns locks held by the current thread with their depth
+
+        :return: dict
+        """
+        if not hasattr(VLock.local, 'held'):
+            VLock.local.held = {}
+
+        return VLock.local.held
+
+    def __enter__(self):
+        if self.path in self.held:
+            self.held[self.path][1] += 1
+            return self
+
+        path = os.path.dirname(self.path)
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except (OSError, IOError):
+                if not os.path.isdir(path):
+                    raise
+
+        stream = open(self.path, 'a')
+        if fcntl:
+            fcntl.flock(stream.fileno(), fcntl.LOCK_EX)
+
+        self.held[self.path] = [stream, 1]
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        entry = self.held[self.path]
+        entry[1] -= 1
+
+        if entry[1] == 0:
+            del self.held[self.path]
+            if fcntl:
+                fcntl.flock(entry[0].fileno(), fcntl.LOCK_UN)
+            entry[0].close()
@@ -1,2 +1,3 @@
 from .base import VMetadataObject
 from .images import VMetadataImage, VMetadataVersion, VMetadataProvider
+from .versions import VVersionIndex
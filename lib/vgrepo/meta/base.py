@@ -1,36 +1,40 @@
 import json
-from vgrepo.utils import VJSONEncoder
 
 
 class VMetadataObject(object):
+    """
+    Base class of the metadata objects. Attributes are declared by __slots__
+    of the subclass and serialized by json_repr without recursive dispatch.
+    """
+
+    __slots__ = ()
 
     def __repr__(self):
         return "{cls}::{obj}".format(cls=self.__class__.__name__, obj=self.to_json())
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return type(self) is type(other) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
 
     def __str__(self):
-        return "{cls}::".format(cls=self.__class__.__name__) + str(self.__dict__)
+        return "{cls}::".format(cls=self.__class__.__name__) + str(dict((k, getattr(self, k)) for k in self.__slots__))
 
     def json_repr(self):
-        data = {}
-        for k, v in vars(self).items():
-            data.update(dict({k: v}))
-
-        return data
+        return dict((k, getattr(self, k)) for k in self.__slots__)
 
     @classmethod
     def from_json(cls, attributes):
-        attr = {}
-        for k, v in attributes.items():
-            attr.update(dict({k: v}))
+        return cls(**attributes)
 
-        return cls(**attr)
+    def to_json(self, compact=False):
+        if compact:
+            return json.dumps(self.json_repr(), separators=(',', ':'), sort_keys=True)
 
-    def to_json(self):
         return json.dumps(
             self.json_repr(),
-            cls=VJSONEncoder,
             indent=4, sort_keys=True
         )
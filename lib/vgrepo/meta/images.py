@@ -3,6 +3,8 @@ from .base import VMetadataObject
 
 class VMetadataImage(VMetadataObject):
 
+    __slots__ = ('name', 'description', 'versions')
+
     def __init__(self, name=None, versions=None, description=None):
         """
         :param name: name of the image
@@ -17,14 +19,32 @@ class VMetadataImage(VMetadataObject):
         self.description = description
         if versions:
             self.versions = [v if isinstance(v, VMetadataVersion)
-                             else VMetadataVersion().from_json(v)
+                             else VMetadataVersion.from_json(v)
                              for v in versions]
         else:
             self.versions = []
 
+    def json_repr(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'versions': [v.json_repr() for v in self.versions],
+        }
+
+    @classmethod
+    def from_json(cls, attributes):
+        obj = cls.__new__(cls)
+        obj.name = attributes.get('name')
+        obj.description = attributes.get('description')
+        obj.versions = [VMetadataVersion.from_json(v) for v in attributes.get('versions') or ()]
+
+        return obj
+
 
 class VMetadataVersion(VMetadataObject):
 
+    __slots__ = ('version', 'providers')
+
     def __init__(self, version=None, providers=None):
         """
         :param version: short number of Version divided by dots
@@ -36,14 +56,32 @@ class VMetadataVersion(VMetadataObject):
         self.version = version
         if providers:
             self.providers = [p if isinstance(p, VMetadataProvider)
-                              else VMetadataProvider().from_json(p)
+                              else VMetadataProvider.from_json(p)
                               for p in providers]
         else:
             self.providers = None
 
+    def json_repr(self):
+        return {
+            'version': self.version,
+            'providers': [p.json_repr() for p in self.providers] if self.providers is not None else None,
+        }
+
+    @classmethod
+    def from_json(cls, attributes):
+        providers = attributes.get('providers')
+
+        obj = cls.__new__(cls)
+        obj.version = attributes.get('version')
+        obj.providers = [VMetadataProvider.from_json(p) for p in providers] if providers else None
+
+        return obj
+
 
 class VMetadataProvider(VMetadataObject):
 
+    __slots__ = ('url', 'name', 'checksum_type', 'checksum')
+
     def __init__(self, url=None, name=None, checksum_type=None, checksum=None):
         """
         :param url: Public accessible URL of the image
@@ -60,3 +98,21 @@ class VMetadataProvider(VMetadataObject):
         self.name = name
         self.checksum_type = checksum_type
         self.checksum = checksum
+
+    def json_repr(self):
+        return {
+            'url': self.url,
+            'name': self.name,
+            'checksum_type': self.checksum_type,
+            'checksum': self.checksum,
+        }
+
+    @classmethod
+    def from_json(cls, attributes):
+        obj = cls.__new__(cls)
+        obj.url = attributes.get('url')
+        obj.name = attributes.get('name')
+        obj.checksum_type = attributes.get('checksum_type')
+        obj.checksum = attributes.get('checksum')
+
+        return obj
@@ -0,0 +1,148 @@
+import bisect
+
+
+class VVersionIndex(object):
+    """
+    Keeps versions of the image sorted by their parsed keys, so lookups,
+    inserts and removals take O(log n) comparisons and the latest version
+    is available in constant time
+    """
+
+    @staticmethod
+    def parse(version):
+        """
+        Returns parsed version, raises ValueError if the version does not
+        follow PEP 440
+
+        :param version: version string
+        :type version: str
+        :return: packaging.version.Version
+        """
+        from packaging.version import Version
+
+        return Version(str(version))
+
+    @staticmethod
+    def is_valid(version):
+        """
+        Returns is the version parsable or not
+
+        :param version: version string
+        :type version: str
+        :return: bool
+        """
+        try:
+            VVersionIndex.parse(version)
+        except ValueError:
+            return False
+
+        return True
+
+    @staticmethod
+    def key(version):
+        """
+        Returns comparable key of the version. Versions which can not be
+        parsed (e.g. added by older releases) are sorted first by their strings,
+        as older than any parsable version.
+
+        :param version: version string
+        :type version: str
+        :return: tuple
+        """
+        try:
+            return 1, VVersionIndex.parse(version)
+        except ValueError:
+            return 0, str(version)
+
+    def __init__(self, versions=None):
+        """
+        :param versions: list of VMetadataVersion objects
+        :type versions: collections.Iterable
+        """
+        pairs = sorted(((VVersionIndex.key(v.version), v) for v in versions or []), key=lambda p: p[0])
+
+        self.keys = [k for k, _ in pairs]
+        self.entries = [v for _, v in pairs]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, version):
+        return self.find(version) != -1
+
+    def find(self, version):
+        """
+        Returns position of the version in the index or -1 if it is absent
+
+        :param version: version string
+        :type version: str
+        :return: int
+        """
+        key = VVersionIndex.key(version)
+        i = bisect.bisect_left(self.keys, key)
+
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def get(self, version):
+        """
+        Returns metadata of the version or None if it is absent
+
+        :param version: version string
+        :type version: str
+        :return: VMetadataVersion
+        """
+        i = self.find(version)
+
+        return self.entries[i] if i != -1 else None
+
+    def add(self, entry):
+        """
+        Inserts metadata of the version keeping the order
+
+        :param entry: metadata of the version
+        :type entry: VMetadataVersion
+        :return:
+        """
+        key = VVersionIndex.key(entry.version)
+        i = bisect.bisect_right(self.keys, key)
+
+        self.keys.insert(i, key)
+        self.entries.insert(i, entry)
+
+    def remove(self, version):
+        """
+        Removes version from the index
+
+        :param version: version string
+        :type version: str
+        :return: removed VMetadataVersion or None if it is absent
+        """
+        i = self.find(version)
+        if i == -1:
+            return None
+
+        del self.keys[i]
+        return self.entries.pop(i)
+
+    @property
+    def latest(self):
+        """
+        Returns metadata of the latest parsable version or None if there is
+        no such version
+
+        :return: VMetadataVersion
+        """
+        return self.entries[-1] if self.entries and self.keys[-1][0] else None
+
+    @property
+    def legacy(self):
+        """
+        Returns amount of versions which can not be parsed, they are at the
+        beginning of the index
+
+        :return: int
+        """
+        return bisect.bisect_left(self.keys, (1,))
@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import struct
+import time
+
+from email.utils import formatdate
+from urllib.parse import unquote, urlparse
+
+from .server import VMetadataCache
+from .storage import VStorage
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+IN_EVENT = struct.Struct('iIII')
+
+
+class VWatchedMetadataCache(VMetadataCache):
+    """
+    Metadata cache which is refreshed by the watcher, so requests are served
+    from memory without touching the disk. Watchers load every repository on
+    start and on its changes, so names which are not cached do not exist.
+    """
+
+    def get(self, name):
+        entry = self.entries.get(name)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        # Unknown names are answered from memory, so requests for random
+        # paths neither block the loop on the disk nor grow the cache
+        self.misses += 1
+        return None
+
+    def refresh(self, name):
+        """
+        Reloads metadata of the repository after the change on the disk
+
+        :param name: name of the repository
+        :type name: str
+        :return: VMetadataEntry or None
+        """
+        return self.load(name)
+
+    def drop(self, name):
+        """
+        Forgets metadata of the removed repository
+
+        :param name: name of the repository
+        :type name: str
+        :return:
+        """
+        self.entries.pop(name, None)
+
+    def rescan(self):
+        """
+        Reloads every repository which metadata is changed since the last load
+        and drops removed ones
+
+        :return:
+        """
+        names = set(VStorage.list_dirs(self.root))
+
+        for name in list(self.entries):
+            if name not in names:
+                self.drop(name)
+
+        for name in names:
+            entry = self.entries.get(name)
+            try:
+                key = VMetadataCache.key(os.stat(self.path(name)))
+            except (OSError, IOError):
+                key = None
+
+            if entry is None or entry.key != key:
+                self.refresh(name)
+
+
+class VPollWatcher:
+    """
+    Refreshes the cache by checking modification time of every metadata file
+    """
+
+    name = "poll"
+
+    def __init__(self, cache, interval=1.0):
+        """
+        :param cache: cache of the metadata
+        :type cache: VWatchedMetadataCache
+        :param interval: seconds between the checks
+        :type interval: float
+        """
+        self.cache = cache
+        self.interval = interval
+        self.loop = None
+
+    def start(self, loop):
+        self.loop = loop
+        self.cache.rescan()
+        self.loop.call_later(self.interval, self.poll)
+
+    def poll(self):
+        self.cache.rescan()
+        self.loop.call_later(self.interval, self.poll)
+
+
+class VInotifyWatcher:
+    """
+    Refreshes the cache on inotify events of the storage, repositories and
+    their metadata directories. Only Linux is supported.
+    """
+
+    name = "inotify"
+
+    ROOT_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_ONLYDIR
+    REPO_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+    META_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_ONLYDIR
+
+    def __init__(self, cache):
+        """
+        :param cache: cache of the metadata
+        :type cache: VWatchedMetadataCache
+        """
+        self.cache = cache
+        self.watches = {}
+        self.loop = None
+
+        name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(name or 'libc.so.6', use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not supported")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "unable to initialize inotify")
+
+    def watch(self, path, mask, kind, name=None):
+        """
+        Adds watch of the directory, missing directories are skipped
+
+        :param path: path to the directory
+        :param mask: mask of the events
+        :param kind: root, repo or meta
+        :param name: name of the repository
+        :return: bool
+        """
+        wd = self.libc.inotify_add_watch(self.fd, path.encode('utf-8'), mask)
+        if wd < 0:
+            return False
+
+        self.watches[wd] = (kind, name)
+        return True
+
+    def watch_repo(self, name):
+        """
+        Watches directory of the repository and its metadata, then loads it
+        to catch changes made before the watches were added
+
+        :param name: name of the repository
+        :return:
+        """
+        path = os.path.join(self.cache.root, name)
+        if self.watch(path, VInotifyWatcher.REPO_MASK, 'repo', name):
+            self.watch(os.path.join(path, "metadata"), VInotifyWatcher.META_MASK, 'meta', name)
+        self.cache.refresh(name)
+
+    def resync(self):
+        """
+        Watches and reloads every repository, drops removed ones. Events may
+        be lost on overflow of the queue, so directories created meanwhile
+        are watched too (watching a directory twice keeps the same watch).
+
+        :return:
+        """
+        names = set(VStorage.list_dirs(self.cache.root))
+
+        for name in list(self.cache.entries):
+            if name not in names:
+                self.cache.drop(name)
+
+        for name in names:
+            self.watch_repo(name)
+
+    def start(self, loop):
+        self.loop = loop
+        self.watch(self.cache.root, VInotifyWatcher.ROOT_MASK, 'root')
+        self.resync()
+
+        loop.add_reader(self.fd, self.read)
+
+    def read(self):
+        """
+        Reads pending events and refreshes affected repositories
+
+        :return:
+        """
+        changed = set()
+
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except (OSError, IOError) as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, size = IN_EVENT.unpack_from(data, offset)
+                name = data[offset + IN_EVENT.size:offset + IN_EVENT.size + size].rstrip(b'\0').decode('utf-8')
+                offset += IN_EVENT.size + size
+
+                if mask & IN_Q_OVERFLOW:
+                    self.resync()
+                    continue
+
+                kind, repo = self.watches.get(wd, (None, None))
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                elif name.startswith('.'):
+                    continue
+                elif kind == 'root' and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.watch_repo(name)
+                elif kind == 'root':
+                    self.cache.drop(name)
+                    changed.discard(name)
+                elif kind == 'repo' and name == "metadata":
+                    self.watch(os.path.join(self.cache.root, repo, name), VInotifyWatcher.META_MASK, 'meta', repo)
+                    changed.add(repo)
+                elif kind == 'meta' and name.startswith("{0}.json".format(repo)):
+                    changed.add(repo)
+
+        for name in changed:
+            self.cache.refresh(name)
+
+
+class VMetadataProtocol(object):
+    """
+    Answers HTTP requests for metadata from the cache, keep-alive and
+    pipelined requests are supported
+    """
+
+    REASONS = {
+        200: "OK",
+        304: "Not Modified",
+        400: "Bad Request",
+        404: "Not Found",
+        405: "Method Not Allowed",
+    }
+
+    # Maximum size of request headers
+    MAX_HEADERS = 65536
+
+    def __init__(self, service):
+        """
+        :param service: metadata service
+        :type service: VMetadataService
+        """
+        self.service = service
+        self.transport = None
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def eof_received(self):
+        return False
+
+    def pause_writing(self):
+        pass
+
+    def resume_writing(self):
+        pass
+
+    def data_received(self, data):
+        self.buffer += data
+
+        while self.transport is not None:
+            end = self.buffer.find(b'\r\n\r\n')
+            if end == -1:
+                if len(self.buffer) > VMetadataProtocol.MAX_HEADERS:
+                    self.respond(400, close=True)
+                return
+
+            head, self.buffer = self.buffer[:end].decode('latin-1'), self.buffer[end + 4:]
+            self.handle(head)
+
+    def handle(self, head):
+        """
+        Handles single request by its request line and headers
+
+        :param head: request line and headers
+        :type head: str
+        :return:
+        """
+        self.service.requests += 1
+
+        lines = head.split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            return self.respond(400, close=True)
+
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+
+        if method not in ('GET', 'HEAD'):
+            return self.respond(405, close=close)
+
+        path = unquote(urlparse(target).path)
+        prefix = self.service.prefix
+        if prefix and not (path == prefix or path.startswith(prefix + '/')):
+            return self.respond(404, close=close)
+        parts = [p for p in path[len(prefix):].split('/') if p]
+
+        if parts == ['-', 'stats']:
+            body = json.dumps(self.service.stats(), sort_keys=True).encode('utf-8')
+            return self.respond(200, body, close=close, head=method == 'HEAD')
+
+        name = None
+        if len(parts) == 1:
+            name = parts[0]
+        elif len(parts) == 3 and parts[1] == "metadata" and parts[2] == "{0}.json".format(parts[0]):
+            name = parts[0]
+
+        entry = self.service.cache.get(name) if name and not name.startswith('.') else None
+        if entry is None:
+            return self.respond(404, close=close)
+
+        gzipped = entry.gzipped is not None and 'gzip' in headers.get('accept-encoding', '')
+        etag = '{0}-gzip"'.format(entry.etag[:-1]) if gzipped else entry.etag
+
+        extra = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+        if gzipped:
+            extra.append(('Content-Encoding', 'gzip'))
+
+        tags = headers.get('if-none-match')
+        if tags and (tags == '*' or etag in [t.strip() for t in tags.split(',')]):
+            return self.respond(304, extra=extra, close=close)
+
+        self.respond(200, entry.gzipped if gzipped else entry.data, extra, close, method == 'HEAD')
+
+    def respond(self, status, body=b'', extra=None, close=False, head=False):
+        """
+        Writes response to the transport
+
+        :param status: status code
+        :param body: content of the response
+        :param extra: additional headers
+        :param close: close the connection after the response
+        :param head: do not send the body
+        :return:
+        """
+        lines = [
+            "HTTP/1.1 {0} {1}".format(status, VMetadataProtocol.REASONS[status]),
+            "Server: vgrepo",
+            "Date: {0}".format(self.service.date()),
+            "Content-Type: application/json",
+            "Content-Length: {0}".format(len(body)),
+        ]
+        lines.extend("{0}: {1}".format(k, v) for k, v in extra or [])
+        if close:
+            lines.append("Connection: close")
+
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        self.transport.write(data + body if not head else data)
+
+        if close:
+            self.transport.close()
+            self.transport = None
+
+
+class VMetadataService:
+    """
+    Asyncio server which keeps parsed and serialized metadata of every
+    repository in memory and refreshes it by inotify or by polling
+    """
+
+    def __init__(self, settings, watcher='auto', interval=1.0):
+        """
+        :param settings: settings of the storage
+        :type settings: VSettings
+        :param watcher: auto, inotify or poll
+        :type watcher: str
+        :param interval: seconds between checks of the poll watcher
+        :type interval: float
+        """
+        self.cache = VWatchedMetadataCache(settings.storage_path)
+        self.prefix = urlparse(settings.storage_url).path.rstrip('/')
+        self.watcher = None
+        self.requests = 0
+        self.started = time.time()
+        self.dated = (0, None)
+
+        if watcher in ('auto', 'inotify'):
+            try:
+                self.watcher = VInotifyWatcher(self.cache)
+            except (OSError, AttributeError):
+                if watcher == 'inotify':
+                    raise
+
+        if self.watcher is None:
+            self.watcher = VPollWatcher(self.cache, interval)
+
+    def date(self):
+        """
+        Returns value of the Date header, it is formatted once per second
+
+        :return: str
+        """
+        now = int(time.time())
+        if self.dated[0] != now:
+            self.dated = (now, formatdate(now, usegmt=True))
+
+        return self.dated[1]
+
+    def stats(self):
+        """
+        Returns counters of the cache
+
+        :return: dict
+        """
+        return {
+            'watcher': self.watcher.name,
+            'repositories': len(self.cache.entries),
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'loads': self.cache.loads,
+            'requests': self.requests,
+            'uptime': int(time.time() - self.started),
+        }
+
+    def protocol(self):
+        return VMetadataProtocol(self)
+
+    def run(self, address):
+        """
+        Serves requests until interrupted
+
+        :param address: host and port to listen
+        :type address: tuple
+        :return:
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        self.watcher.start(loop)
+        server = loop.run_until_complete(loop.create_server(self.protocol, address[0] or None, address[1],
+                                                            backlog=1024, reuse_address=True))
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import sys
+
+from .utils import write_atomic
+
+
+class VMetrics:
+    """
+    Renders metrics of the storage in the Prometheus text format for the
+    textfile collector of node_exporter. Values are read from the counters
+    and sizes maintained in the catalog, the storage is not scanned.
+    """
+
+    PREFIX = "vgrepo"
+
+    # Type and help of the counters and gauges stored in the catalog
+    COUNTERS = {
+        'ingests_total': ('counter', "Amount of images added to the storage"),
+        'ingested_bytes_total': ('counter', "Amount of bytes of images added to the storage"),
+        'hash_bytes_total': ('counter', "Amount of bytes hashed while adding images"),
+        'hash_seconds_total': ('counter', "Time spent hashing while adding images"),
+        'errors_total': ('counter', "Amount of failed commands which change the storage"),
+        'last_ingest_duration_seconds': ('gauge', "Duration of the last add command"),
+        'last_ingest_bytes': ('gauge', "Amount of bytes added by the last add command"),
+        'last_ingest_timestamp_seconds': ('gauge', "UNIX time of the last add command"),
+        'last_hash_bytes_per_second': ('gauge', "Hashing throughput of the last add command"),
+    }
+
+    @staticmethod
+    def labels(**kwargs):
+        """
+        Returns label set with escaped values (e.g. repo="box")
+
+        :return: str
+        """
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        return ",".join('{0}="{1}"'.format(k, escape(v)) for k, v in sorted(kwargs.items()))
+
+    @staticmethod
+    def sample(name, value, labels=''):
+        """
+        Returns line of the sample
+
+        :param name: name of the metric without prefix
+        :type name: str
+        :param value: value of the sample
+        :type value: float
+        :param labels: rendered label set
+        :type labels: str
+        :return: str
+        """
+        return "{0}_{1}{2} {3}".format(
+            VMetrics.PREFIX,
+            name,
+            "{{{0}}}".format(labels) if labels else '',
+            repr(float(value)) if isinstance(value, float) and not value.is_integer() else int(value),
+        )
+
+    @staticmethod
+    def header(name, kind, desc):
+        """
+        Returns HELP and TYPE lines of the metric
+
+        :return: list
+        """
+        return [
+            "# HELP {0}_{1} {2}".format(VMetrics.PREFIX, name, desc),
+            "# TYPE {0}_{1} {2}".format(VMetrics.PREFIX, name, kind),
+        ]
+
+    def __init__(self, catalog):
+        """
+        :param catalog: catalog of the storage
+        :type catalog: VCatalog
+        """
+        self.catalog = catalog
+
+    def render(self):
+        """
+        Returns metrics in the Prometheus text format
+
+        :return: str
+        """
+        totals = self.catalog.totals()
+        lines = []
+
+        lines += VMetrics.header('repositories', 'gauge', "Amount of repositories in the storage")
+        lines.append(VMetrics.sample('repositories', len(totals)))
+
+        lines += VMetrics.header('storage_bytes', 'gauge', "Size of the images in the storage")
+        lines.append(VMetrics.sample('storage_bytes', sum(size for _, _, size in totals)))
+
+        lines += VMetrics.header('repository_versions', 'gauge', "Amount of versions of the repository")
+        for name, versions, _ in totals:
+            lines.append(VMetrics.sample('repository_versions', versions, VMetrics.labels(repo=name)))
+
+        lines += VMetrics.header('repository_bytes', 'gauge', "Size of the images of the repository")
+        for name, _, size in totals:
+            lines.append(VMetrics.sample('repository_bytes', size, VMetrics.labels(repo=name)))
+
+        samples = {}
+        for name, labels, value in self.catalog.counters():
+            samples.setdefault(name, []).append(VMetrics.sample(name, value, labels))
+
+        for name in sorted(samples):
+            if name in VMetrics.COUNTERS:
+                lines += VMetrics.header(name, *VMetrics.COUNTERS[name])
+            lines += samples[name]
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Writes metrics to the file atomically, so the collector never reads
+        a partially written file
+
+        :param path: path to the metrics file (e.g. *.prom)
+        :type path: str
+        :return: bool
+        """
+        try:
+            if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+                os.makedirs(os.path.dirname(os.path.abspath(path)))
+            write_atomic(path, self.render())
+        except (OSError, IOError):
+            sys.stderr.write("Error: unable to write metrics to '{0}'\n".format(path))
+            return False
+
+        return True
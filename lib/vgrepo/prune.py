@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+
+from .meta.versions import VVersionIndex
+
+
+class VRetentionPolicy:
+    """
+    Selects versions of the repository which should be pruned, a version is
+    kept if it matches any of the rules
+    """
+
+    def __init__(self, keep=None, newer=None, specifier=None):
+        """
+        :param keep: amount of the latest versions to keep
+        :type keep: int
+        :param newer: UNIX timestamp, images added after it are kept
+        :type newer: float
+        :param specifier: versions to keep (e.g. ">=2.0,<3")
+        :type specifier: str
+        """
+        if keep is None and newer is None and not specifier:
+            raise ValueError("At least one retention rule is required")
+
+        if keep is not None and keep < 0:
+            raise ValueError("Amount of kept versions should not be negative")
+
+        self.keep = keep
+        self.newer = newer
+        self.specifier = None
+
+        if specifier:
+            from packaging.specifiers import SpecifierSet
+
+            self.specifier = SpecifierSet(specifier)
+
+    def is_kept(self, repo, version, latest):
+        """
+        Returns should the version be kept or not
+
+        :param repo: repository of the version
+        :type repo: VRepository
+        :param version: metadata of the version
+        :type version: VMetadataVersion
+        :param latest: is the version one of the last N versions
+        :type latest: bool
+        :return: bool
+        """
+        if latest:
+            return True
+
+        if self.specifier is not None and VVersionIndex.is_valid(version.version):
+            if self.specifier.contains(VVersionIndex.parse(version.version), True):
+                return True
+
+        if self.newer is not None:
+            try:
+                # Change time is set when the image is placed into the repository, while
+                # modification time is preserved from the source by copy, link and move
+                return os.stat(repo.get_image_path(version.version)).st_ctime > self.newer
+            except (OSError, IOError):
+                # Missing images are never kept by age
+                return False
+
+        return False
+
+    def select(self, repo):
+        """
+        Returns versions of the repository which are not kept by any rule,
+        ordered from the oldest one. Versions which can not be parsed are not
+        counted by --keep and are kept by it, so only --match or --newer-than
+        without --keep may remove them.
+
+        :param repo: repository to prune
+        :type repo: VRepository
+        :return: list of VMetadataVersion
+        """
+        entries = list(repo.versions)
+        legacy = repo.versions.legacy
+
+        if self.keep is None:
+            cutoff = len(entries)
+        else:
+            cutoff = max(legacy, len(entries) - self.keep)
+
+        return [v for i, v in enumerate(entries)
+                if not self.is_kept(repo, v, i >= cutoff or (self.keep is not None and i < legacy))]
@@ -1,15 +1,19 @@
 #!/usr/bin/env python
 # coding: utf8
 
+import errno
 import hashlib
 import json
 import os
 import shutil
-from copy import deepcopy
 
-from packaging.version import Version
-
-from .meta.images import VMetadataImage
+from .checksums import VChecksumCache
+from .ingest import VIngestPipeline
+from .locks import VLock
+from .timings import VTimings
+from .meta.images import VMetadataImage, VMetadataVersion, VMetadataProvider
+from .meta.versions import VVersionIndex
+from .utils import gzip_compress, write_atomic
 
 
 class VImageNotFound(Exception):
@@ -32,6 +36,70 @@ class VRepository:
 
     SHA256_BUFFER_SIZE = 65536
 
+    @property
+    def meta(self):
+        """
+        Returns metadata of the repository, it is loaded on the first access
+
+        :return: VMetadataImage
+        """
+        if self._meta is None:
+            self.reload()
+
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta):
+        """
+        Replaces metadata of the repository, index of versions is rebuilt
+        on the next access
+
+        :param meta: metadata of the repository
+        :type meta: VMetadataImage
+        """
+        self._meta = meta
+        self._versions = None
+
+    @property
+    def versions(self):
+        """
+        Returns index of versions of the repository
+
+        :return: VVersionIndex
+        """
+        if self._versions is None:
+            self._versions = VVersionIndex(self.meta.versions)
+
+        return self._versions
+
+    @property
+    def is_loaded(self):
+        """
+        Returns is the metadata loaded in memory or not
+
+        :return: bool
+        """
+        return self._meta is not None
+
+    def reload(self):
+        """
+        Loads metadata from the disk replacing the one in memory
+
+        :return: self
+        """
+        self.meta = self.load_meta()
+
+        return self
+
+    @property
+    def latest(self):
+        """
+        Returns metadata of the latest version or None if the repository is empty
+
+        :return: VMetadataVersion
+        """
+        return self.versions.latest
+
     @property
     def is_empty(self):
         """
@@ -51,7 +119,7 @@ class VRepository:
         try:
             return os.path.isfile(self.meta_path)
         except (OSError, IOError):
-            print("Error: unable to read metadata for '{0}'".format(self.meta.name))
+            print("Error: unable to read metadata for '{0}'".format(self.name))
 
     def has_image(self, version=None):
         """
@@ -68,7 +136,7 @@ class VRepository:
                 path = self.image_dir
                 return os.path.isdir(path)
         except (OSError, IOError):
-            print("Error: unable to read image '{0}'".format(self.meta.name))
+            print("Error: unable to read image '{0}'".format(self.name))
 
         return False
 
@@ -101,7 +169,17 @@ class VRepository:
         """
         path_format = "{name}.json"
 
-        return os.path.join(self.meta_dir, path_format.format(name=self.meta.name))
+        return os.path.join(self.meta_dir, path_format.format(name=self.name))
+
+    @property
+    def meta_gz_path(self):
+        """
+        Returns path to the compact gzipped copy of the metadata, which is
+        served by nginx gzip_static instead of compressing on every request
+
+        :return: str
+        """
+        return "{0}.gz".format(self.meta_path)
 
     @property
     def image_dir(self):
@@ -110,7 +188,7 @@ class VRepository:
 
         :return: str
         """
-        return os.path.join(self.settings.storage_path, self.meta.name)
+        return os.path.join(self.settings.storage_path, self.name)
 
     @property
     def repo_url(self):
@@ -121,7 +199,7 @@ class VRepository:
         """
         url_format = "{url}/{name}"
 
-        return url_format.format(url=self.settings.storage_url, name=self.meta.name)
+        return url_format.format(url=self.settings.storage_url, name=self.name)
 
     def get_image_path(self, version):
         """
@@ -132,7 +210,19 @@ class VRepository:
         """
         path_format = "{name}-{version}.box"
 
-        return os.path.join(self.image_dir, path_format.format(name=self.meta.name, version=version))
+        return os.path.join(self.image_dir, path_format.format(name=self.name, version=version))
+
+    def get_temp_image_path(self, version):
+        """
+        Returns path to the hidden file which receives the image before it
+        is moved into place
+
+        :param version: version of the image
+        :return: str
+        """
+        path_format = ".{name}-{version}.box.{pid}.part"
+
+        return os.path.join(self.image_dir, path_format.format(name=self.name, version=version, pid=os.getpid()))
 
     def get_image_url(self, version):
         """
@@ -143,7 +233,7 @@ class VRepository:
         """
         url_format = "{url}/{name}-{version}.box"
 
-        return url_format.format(url=self.repo_url, name=self.meta.name, version=version)
+        return url_format.format(url=self.repo_url, name=self.name, version=version)
 
     @staticmethod
     def get_sha256_checksum(path):
@@ -155,45 +245,119 @@ class VRepository:
         """
         sha256 = hashlib.sha256()
 
-        try:
-            with open(path, 'r') as stream:
-                while True:
-                    chunk = stream.read(VRepository.SHA256_BUFFER_SIZE)
-                    if not chunk:
-                        break
-                    sha256.update(chunk)
-        except [OSError, IOError]:
-            print("Error: unable to read file {0}".format(path))
+        with VTimings.span('hash') as span:
+            try:
+                with open(path, 'rb') as stream:
+                    while True:
+                        chunk = stream.read(VRepository.SHA256_BUFFER_SIZE)
+                        if not chunk:
+                            break
+                        sha256.update(chunk)
+                        span.bytes += len(chunk)
+            except (OSError, IOError):
+                print("Error: unable to read file {0}".format(path))
 
         return sha256.hexdigest() if sha256 else sha256
 
+    @property
+    def checksums(self):
+        """
+        Returns checksum cache of the storage
+
+        :return: VChecksumCache
+        """
+        if self._checksums is None and self.settings:
+            self._checksums = VChecksumCache(
+                os.path.join(self.settings.state_path, VChecksumCache.FILENAME),
+                self.settings.checksum_cache_size
+            )
+
+        return self._checksums
+
+    def checksum(self, path):
+        """
+        Returns SHA256 string of the file, unchanged files are not hashed again
+
+        :param path: path to the hashed file
+        :return: str
+        """
+        if self.checksums is None:
+            return VRepository.get_sha256_checksum(path)
+
+        return self.checksums.checksum(path, VRepository.get_sha256_checksum)
+
+    def lock(self):
+        """
+        Returns advisory lock of the repository which guards read-modify-write
+        of the metadata
+
+        :return: VLock
+        """
+        return VLock(os.path.join(self.settings.state_path, "locks", "{0}.lock".format(self.name)))
+
+    def commit(self):
+        """
+        Saves metadata on the disk and notifies commit hooks, should be called
+        under the lock of the repository
+
+        :return: bool
+        """
+        if not self.dump_meta():
+            return False
+
+        for hook in self.commit_hooks:
+            hook(self.meta)
+
+        return True
+
     def load_meta(self):
         """
         Loads or creates metadata for itself by given name
 
         :return:
         """
-        if self.has_meta:
-            return VRepository.parse_meta(self.meta_path, VMetadataImage)
-        else:
-            return VMetadataImage(name=self.meta.name)
+        if not self.has_meta:
+            return VMetadataImage(name=self.name)
+
+        with VTimings.span('load_meta') as span:
+            meta = VRepository.parse_meta(self.meta_path, VMetadataImage)
+            if VTimings.active:
+                span.bytes = os.path.getsize(self.meta_path)
+
+        return meta
 
     def dump_meta(self):
         """
-        Saves metadata on the disk
+        Saves metadata on the disk together with its compact gzipped copy
 
         :return:
         """
         path = self.meta_dir
-        try:
-            if not os.path.isdir(path):
-                os.makedirs(path)
 
-            with open(self.meta_path, 'w') as stream:
-                stream.write("{0}\n".format(self.meta.to_json()))
-        except (OSError, IOError):
-            print("Error: unable to write metadata to '{0}'".format(self.meta_path))
-            return False
+        with VTimings.span('dump_meta') as span:
+            try:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+
+                data = "{0}\n".format(self.meta.to_json())
+                write_atomic(self.meta_path, data)
+                span.bytes += len(data)
+            except (OSError, IOError):
+                print("Error: unable to write metadata to '{0}'".format(self.meta_path))
+                return False
+
+            # Compressed copy is derived from the saved metadata, a stale one is
+            # removed so the web server falls back to the plain file
+            try:
+                data = gzip_compress(self.meta.to_json(compact=True))
+                write_atomic(self.meta_gz_path, data)
+                span.bytes += len(data)
+            except (OSError, IOError):
+                print("Error: unable to write metadata to '{0}'".format(self.meta_gz_path))
+                try:
+                    os.remove(self.meta_gz_path)
+                except (OSError, IOError):
+                    pass
 
         return True
 
@@ -223,7 +387,7 @@ class VRepository:
         :param second: second version
         :return: bool
         """
-        return Version(str(first)) == Version(str(second))
+        return VVersionIndex.key(first) == VVersionIndex.key(second)
 
     @staticmethod
     def not_equal_versions(first, second):
@@ -238,21 +402,18 @@ class VRepository:
 
     def filter_versions(self, func, version=None):
         """
-        Returns list of images without versions by given function filter
+        Returns list of images without versions by given function filter,
+        the result shares version objects with the repository's metadata
 
         :param func: name of the filter function
         :param version: number of version
         :return:
         """
-        meta = deepcopy(self.meta)
-
-        if not self.is_empty:
-            meta.versions = filter(
-                lambda x: func(x.version, version),
-                self.meta.versions
-            )
-
-        return meta
+        return VMetadataImage(
+            name=self.name,
+            description=self.meta.description,
+            versions=[v for v in self.meta.versions if func(v.version, version)]
+        )
 
     def remove_meta(self):
         """
@@ -263,6 +424,8 @@ class VRepository:
         try:
             if self.has_meta:
                 os.remove(self.meta_path)
+            if os.path.isfile(self.meta_gz_path):
+                os.remove(self.meta_gz_path)
         except (OSError, IOError):
             print("Error: unable to delete metadata {0}".format(self.meta_path))
             return False
@@ -271,12 +434,12 @@ class VRepository:
 
     def sync_meta(self, meta):
         """
-        Saves meta in memory by given copy
+        Saves meta in memory by given object, the object is not copied
 
-        :param meta: copied meta object
+        :param meta: meta object
         :return:
         """
-        self.meta = deepcopy(meta)
+        self.meta = meta
 
     def has_version(self, version):
         """
@@ -285,33 +448,183 @@ class VRepository:
         :param version: version of the image
         :return:
         """
-        entries = self.filter_versions(VRepository.is_equal_versions, version)
+        return version in self.versions
 
-        if entries.versions:
-            return True
-        else:
-            return False
+    def make_image_dir(self):
+        """
+        Creates directory for the images of the repository, it is safe to call
+        concurrently
 
-    def copy_image(self, src, version):
+        :return:
         """
-        Copies image to the repository's directory
+        with VTimings.span('mkdir'):
+            try:
+                os.makedirs(self.image_dir)
+            except (OSError, IOError):
+                if not os.path.isdir(self.image_dir):
+                    raise
+
+    def ingest_image(self, src, version, mode='copy', size=None, checksum=None):
+        """
+        Copies image to the repository's directory and computes its checksum,
+        the copy strategy is chosen by VIngestPipeline
+
+        :param src: path to the original image file or readable binary stream
+        :param version: version of the image
+        :param mode: copy, link or move (images on another device are copied)
+        :param size: expected size of the image in bytes (optional)
+        :param checksum: expected SHA256 checksum of the image (optional)
+        :return: VIngestPipeline or None on failure
+        """
+        if hasattr(src, 'read'):
+            return self.check_image(self.ingest_stream(src, version), size, checksum, stream=True)
+
+        return self.check_image(self.ingest_file(src, version, mode), size, checksum)
+
+    def check_image(self, ingest, size=None, checksum=None, stream=False):
+        """
+        Discards ingested image which does not match expected size or checksum,
+        empty images read from the stream (e.g. closed pipe) are discarded too
+
+        :param ingest: ingested image or None
+        :type ingest: VIngestPipeline
+        :param size: expected size of the image in bytes (optional)
+        :param checksum: expected SHA256 checksum of the image (optional)
+        :param stream: is the image read from the stream
+        :return: VIngestPipeline or None on failure
+        """
+        if ingest is None:
+            return None
+
+        actual = os.path.getsize(ingest.dst)
+        error = None
+
+        if stream and actual == 0:
+            error = "Error: image read from the stream is empty"
+        elif size is not None and actual != size:
+            error = "Error: size of the image is {0} bytes, expected {1}".format(actual, size)
+        elif checksum and ingest.checksum != checksum.lower():
+            error = "Error: checksum of the image is {0}, expected {1}".format(ingest.checksum, checksum.lower())
+
+        if error:
+            print(error)
+            self.discard_image(ingest.dst)
+            return None
+
+        return ingest
+
+    def ingest_file(self, src, version, mode='copy'):
+        """
+        Places copy or link of the image file into the repository's directory
 
         :param src: path to the original image file
         :param version: version of the image
-        :return:
+        :param mode: copy, link or move (images on another device are copied)
+        :return: VIngestPipeline or None on failure
         """
+        tmp = self.get_temp_image_path(version)
+        link = mode in ('link', 'move')
+
         try:
-            if not os.path.isdir(self.image_dir):
-                os.makedirs(self.image_dir)
+            self.make_image_dir()
             if not os.path.isfile(src):
                 raise VImageNotFound(src)
 
-            shutil.copy2(src, self.get_image_path(version))
-            return True
+            if self.checksums is None:
+                return VIngestPipeline(src, tmp, link=link).run()
+
+            # Known checksum of the unchanged source lets to skip hashing at all
+            before = os.stat(src)
+            checksum = self.checksums.get(src)
+            ingest = VIngestPipeline(src, tmp, checksum=checksum, link=link).run()
+
+            if VChecksumCache.key(before) == VChecksumCache.key(os.stat(src)):
+                self.checksums.put(before, ingest.checksum)
+            elif checksum:
+                # Cached checksum does not describe the source changed while copying
+                raise IOError(errno.EIO, "{0} was changed while copying".format(src))
+            self.checksums.put(os.stat(ingest.dst), ingest.checksum)
+
+            return ingest
         except (OSError, IOError):
             print("Error: unable to move {0} to {1}".format(src, self.get_image_path(version)))
+            self.discard_image(tmp)
 
-        return False
+        return None
+
+    def ingest_stream(self, stream, version):
+        """
+        Writes image from the stream (e.g. pipe) to the hidden temporary file
+        in the repository's directory and computes its checksum on the fly
+
+        :param stream: readable binary stream
+        :param version: version of the image
+        :return: VIngestPipeline or None on failure
+        """
+        tmp = self.get_temp_image_path(version)
+
+        try:
+            self.make_image_dir()
+            ingest = VIngestPipeline(stream, tmp).run()
+
+            if self.checksums is not None:
+                self.checksums.put(os.stat(ingest.dst), ingest.checksum)
+
+            return ingest
+        except (OSError, IOError):
+            print("Error: unable to write stream to {0}".format(self.get_image_path(version)))
+            self.discard_image(tmp)
+
+        return None
+
+    @staticmethod
+    def discard_image(path):
+        """
+        Removes partially ingested image file
+
+        :param path: path to the file
+        :return:
+        """
+        try:
+            if os.path.isfile(path):
+                os.remove(path)
+        except (OSError, IOError):
+            print("Error: unable to delete {0}".format(path))
+
+    def place_image(self, ingest, version):
+        """
+        Moves ingested image into place
+
+        :param ingest: result of the ingest
+        :type ingest: VIngestPipeline
+        :param version: version of the image
+        :return:
+        """
+        path = self.get_image_path(version)
+
+        getattr(os, 'replace', os.rename)(ingest.dst, path)
+        ingest.dst = path
+
+    def copy_image(self, src, version):
+        """
+        Copies image to the repository's directory
+
+        :param src: path to the original image file
+        :param version: version of the image
+        :return:
+        """
+        ingest = self.ingest_image(src, version)
+        if ingest is None:
+            return False
+
+        try:
+            self.place_image(ingest, version)
+        except (OSError, IOError):
+            print("Error: unable to move {0} to {1}".format(src, self.get_image_path(version)))
+            self.discard_image(ingest.dst)
+            return False
+
+        return True
 
     def remove_image(self, version):
         """
@@ -324,7 +637,8 @@ class VRepository:
 
         try:
             if self.is_exist(version):
-                os.remove(path)
+                with VTimings.span('unlink'):
+                    os.remove(path)
                 return True
         except (OSError, IOError):
             print("Error: unable to delete {0}".format(path))
@@ -338,49 +652,192 @@ class VRepository:
         :return:
         """
         try:
-            shutil.rmtree(self.image_dir, ignore_errors=True)
+            with VTimings.span('rmtree'):
+                shutil.rmtree(self.image_dir, ignore_errors=True)
         except (OSError, IOError):
             print("Error: unable to delete {0} recursively".format(self.image_dir))
             return False
 
         return True
 
-    def __init__(self, name, settings=None):
+    def __init__(self, name, settings=None, meta=None):
+        """
+        Initializes repository without any disk I/O, metadata is loaded on
+        the first access unless it is given
+
+        :param name: name of the repository
+        :type name: str
+        :param settings: settings of the storage
+        :type settings: VSettings
+        :param meta: already loaded metadata (optional)
+        :type meta: VMetadataImage
+        """
+        self.name = name
         self.settings = settings
-        self.meta = VMetadataImage(name=name)
+        self.ingests = []
+        self.commit_hooks = []
+        self._checksums = None
+        self._meta = None
+        self._versions = None
+
+        if meta is not None:
+            self.meta = meta
+
+    def prepare_version(self, version, checksum):
+        """
+        Returns new version's metadata with providers filled by checksum and
+        URL of the image, given object is left untouched
+
+        :param version: version's metadata
+        :type version: VMetadataVersion
+        :param checksum: SHA256 checksum of the image
+        :type checksum: str
+        :return: VMetadataVersion
+        """
+        url = self.get_image_url(version.version)
+
+        return VMetadataVersion(
+            version=version.version,
+            providers=[VMetadataProvider(
+                name=p.name or "virtualbox",
+                checksum_type="sha256",
+                checksum=checksum,
+                url=url,
+            ) for p in version.providers]
+        )
+
+    def publish(self, entries, description=None):
+        """
+        Moves ingested images into place and saves their versions in the
+        metadata. Metadata is reloaded under the lock of the repository, so
+        versions added concurrently by other processes are kept.
+
+        :param entries: list of (VMetadataVersion, VIngestPipeline)
+        :type entries: list
+        :param description: description of the image if the repository is empty
+        :type description: str
+        :return: bool
+        """
+        with self.lock():
+            self.reload()
+
+            for v, ingest in entries:
+                if self.has_version(v.version):
+                    for _, i in entries:
+                        self.discard_image(i.dst)
+                    raise VImageVersionFoundError(self.name, v.version)
+
+            previous, added = self.meta.description, []
+            if self.is_empty:
+                self.meta.description = description
+
+            try:
+                for v, ingest in entries:
+                    self.place_image(ingest, v.version)
+                    added.append(self.prepare_version(v, ingest.checksum))
+                    self.meta.versions.append(added[-1])
+                    self.versions.add(added[-1])
+                    self.ingests.append(ingest)
+            except (OSError, IOError):
+                print("Error: unable to move images into {0}".format(self.image_dir))
+
+            if len(added) == len(entries) and self.commit():
+                return True
 
-        self.meta = self.load_meta()
+            # Roll back in-memory metadata and images which are not referenced anymore
+            for v in added:
+                self.meta.versions.remove(v)
+                self.versions.remove(v.version)
+            for _, ingest in entries:
+                self.discard_image(ingest.dst)
+                if ingest in self.ingests:
+                    self.ingests.remove(ingest)
+            self.meta.description = previous
+
+            return False
 
-    def add(self, src, img):
+    def add(self, src, img, mode='copy', size=None, checksum=None):
         """
         Adds image to the repository by given file and metadata
 
-        :param src: source image
+        :param src: source image file or readable binary stream
         :param img: image's metadata
+        :param mode: copy, link or move the source into the repository
+        :param size: expected size of the image in bytes (optional)
+        :param checksum: expected SHA256 checksum of the image (optional)
         :return:
         """
-        meta, image = deepcopy(self.meta), deepcopy(img)
+        entries = []
 
-        if self.is_empty:
-            meta.description = image.description
+        for v in img.versions:
+            if self.has_version(v.version):
+                raise VImageVersionFoundError(img.name, v.version)
 
-        for v in image.versions:
-            if not self.has_version(v.version):
-                for p in v.providers:
-                    p.name = p.name or "virtualbox"
-                    p.checksum_type = "sha256"
-                    p.checksum = VRepository.get_sha256_checksum(src)
-                    p.url = self.get_image_url(v.version)
+            ingest = self.ingest_image(src, v.version, mode, size, checksum)
+            if ingest is None:
+                for _, i in entries:
+                    self.discard_image(i.dst)
+                return False
 
-                meta.versions.append(v)
-                self.copy_image(src, v.version)
-                self.sync_meta(meta)
-                self.dump_meta()
-            else:
-                raise VImageVersionFoundError(image.name, v.version)
+            entries.append((v, ingest))
+
+        if not self.publish(entries, img.description):
+            return False
+
+        # Source is removed only when the image is referenced by the metadata
+        if mode == 'move' and not hasattr(src, 'read'):
+            self.discard_image(src)
 
         return True
 
+    def prune(self, policy, dry_run=False, pool=None):
+        """
+        Removes versions selected by the retention policy. Versions are chosen
+        under the lock of the repository from the fresh metadata, which is
+        written once, and then the images are deleted.
+
+        :param policy: retention rules
+        :type policy: VRetentionPolicy
+        :param dry_run: only return versions which would be removed
+        :type dry_run: bool
+        :param pool: pool to delete images concurrently (optional)
+        :type pool: multiprocessing.pool.ThreadPool
+        :return: list of removed VMetadataVersion or None on failure
+        """
+        with self.lock():
+            self.reload()
+
+            pruned = policy.select(self)
+            if dry_run or not pruned:
+                return pruned
+
+            previous = self.meta.versions
+            self.meta.versions = [v for v in previous if not any(v is p for p in pruned)]
+            for v in pruned:
+                self.versions.remove(v.version)
+
+            if self.is_empty:
+                self.remove_meta()
+                self.destroy()
+                self.meta = VMetadataImage(self.name)
+                for hook in self.commit_hooks:
+                    hook(self.meta)
+            elif self.commit():
+                # Images are deleted once metadata does not reference them
+                versions = [v.version for v in pruned]
+                if pool is not None:
+                    pool.map(self.remove_image, versions)
+                else:
+                    for version in versions:
+                        self.remove_image(version)
+            else:
+                self.meta.versions = previous
+                for v in pruned:
+                    self.versions.add(v)
+                return None
+
+        return pruned
+
     @property
     def info(self):
         """
@@ -397,16 +854,29 @@ class VRepository:
         :param version: version of the image
         :return:
         """
-        meta = self.filter_versions(VRepository.not_equal_versions, version)
-
-        self.remove_image(version)
-        self.sync_meta(meta)
-
-        if self.is_empty:
-            self.remove_meta()
-            self.destroy()
-            self.meta = VMetadataImage(self.meta.name)
-        else:
-            self.dump_meta()
+        with self.lock():
+            self.reload()
+
+            removed = self.versions.remove(version)
+            if removed is None:
+                return False
+
+            position = next(i for i, v in enumerate(self.meta.versions) if v is removed)
+            del self.meta.versions[position]
+
+            if self.is_empty:
+                self.remove_image(version)
+                self.remove_meta()
+                self.destroy()
+                self.meta = VMetadataImage(self.name)
+                for hook in self.commit_hooks:
+                    hook(self.meta)
+            elif self.commit():
+                # The image is deleted once metadata does not reference it
+                self.remove_image(version)
+            else:
+                self.meta.versions.insert(position, removed)
+                self.versions.add(removed)
+                return False
 
         return True
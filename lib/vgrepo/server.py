@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import json
+import os
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import urlparse
+
+from .meta.images import VMetadataImage
+
+
+class VMetadataEntry:
+    """
+    Keeps metadata of the repository in memory in parsed and serialized forms
+    """
+
+    def __init__(self, key, data, gzipped, meta):
+        """
+        :param key: modification time and size of the metadata file
+        :type key: tuple
+        :param data: content of the metadata file
+        :type data: bytes
+        :param gzipped: content of the compressed copy or None
+        :type gzipped: bytes
+        :param meta: parsed metadata
+        :type meta: VMetadataImage
+        """
+        self.key = key
+        self.data = data
+        self.gzipped = gzipped
+        self.meta = meta
+        self.etag = '"{0:x}-{1:x}"'.format(*key)
+
+        # Checksums of the images by their file names for ETags
+        self.checksums = {}
+        for v in meta.versions or []:
+            for p in v.providers or []:
+                if p.url and p.checksum:
+                    self.checksums[p.url.rsplit('/', 1)[-1]] = p.checksum
+
+
+class VMetadataCache:
+    """
+    Caches metadata of the repositories in memory, an entry is reloaded
+    when modification time or size of the file is changed
+    """
+
+    def __init__(self, root):
+        """
+        :param root: path to the storage
+        :type root: str
+        """
+        self.root = root
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.mutex = threading.Lock()
+
+    def path(self, name):
+        """
+        Returns path to the metadata of the repository
+
+        :param name: name of the repository
+        :type name: str
+        :return: str
+        """
+        return os.path.join(self.root, name, "metadata", "{0}.json".format(name))
+
+    @staticmethod
+    def key(st):
+        """
+        Returns version of the file by its stat result
+
+        :param st: result of os.stat
+        :return: tuple
+        """
+        return getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9)), st.st_size
+
+    def load(self, name):
+        """
+        Reads metadata of the repository from the disk and replaces the entry,
+        the entry is dropped if the repository does not exist
+
+        :param name: name of the repository
+        :type name: str
+        :return: VMetadataEntry or None
+        """
+        path = self.path(name)
+        self.loads += 1
+
+        try:
+            st = os.stat(path)
+            with open(path, 'rb') as stream:
+                data = stream.read()
+            meta = VMetadataImage.from_json(json.loads(data.decode('utf-8')))
+        except (OSError, IOError, ValueError):
+            with self.mutex:
+                self.entries.pop(name, None)
+            return None
+
+        try:
+            with open("{0}.gz".format(path), 'rb') as stream:
+                gzipped = stream.read()
+            # Compressed copy older than the metadata is stale
+            if os.stat("{0}.gz".format(path)).st_mtime < st.st_mtime:
+                gzipped = None
+        except (OSError, IOError):
+            gzipped = None
+
+        entry = VMetadataEntry(VMetadataCache.key(st), data, gzipped, meta)
+        with self.mutex:
+            self.entries[name] = entry
+
+        return entry
+
+    def get(self, name):
+        """
+        Returns cached metadata of the repository, the file is stat'ed to
+        check if the entry is still valid
+
+        :param name: name of the repository
+        :type name: str
+        :return: VMetadataEntry or None
+        """
+        entry = self.entries.get(name)
+
+        try:
+            key = VMetadataCache.key(os.stat(self.path(name)))
+        except (OSError, IOError):
+            key = None
+
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+
+        return self.load(name) if key is not None else None
+
+
+class VRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves metadata and images with the URL layout of the repositories
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "vgrepo"
+
+    # Seconds to wait for a slow client
+    timeout = 60
+
+    # Headers and body are written separately, Nagle's algorithm would delay
+    # the body of keep-alive responses until the client acknowledges headers
+    disable_nagle_algorithm = True
+
+    CONTENT_TYPES = {
+        '.json': "application/json",
+        '.box': "application/octet-stream",
+    }
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        path = unquote(urlparse(self.path).path)
+        prefix = self.server.prefix
+
+        if prefix and not (path == prefix or path.startswith(prefix + '/')):
+            return self.send_error(404)
+
+        parts = [p for p in path[len(prefix):].split('/') if p]
+
+        if not parts:
+            return self.send_error(404)
+
+        # Decoded %00 can not be a part of the path on the disk
+        if '\0' in path:
+            return self.send_error(400)
+
+        # Hidden files keep internal state of the storage
+        if any(p.startswith('.') for p in parts):
+            return self.send_error(403)
+
+        if len(parts) == 1 and os.path.isdir(os.path.join(self.server.root, parts[0])):
+            return self.send_metadata(parts[0])
+
+        if len(parts) == 3 and parts[1] == "metadata" and parts[2] == "{0}.json".format(parts[0]):
+            return self.send_metadata(parts[0])
+
+        etag = None
+        if len(parts) == 2 and parts[1].endswith(".box"):
+            entry = self.server.cache.get(parts[0])
+            if entry is not None and parts[1] in entry.checksums:
+                etag = '"{0}"'.format(entry.checksums[parts[1]])
+
+        self.send_file(os.path.join(self.server.root, *parts), etag)
+
+    def accepts_gzip(self):
+        """
+        Returns does the client accept gzip encoded responses or not
+
+        :return: bool
+        """
+        return 'gzip' in (self.headers.get('Accept-Encoding') or '')
+
+    def is_not_modified(self, etag):
+        """
+        Returns does the client have the same version of the resource or not
+
+        :param etag: entity tag of the resource
+        :type etag: str
+        :return: bool
+        """
+        tags = self.headers.get('If-None-Match')
+
+        return bool(tags) and (tags.strip() == '*' or etag in [t.strip() for t in tags.split(',')])
+
+    def send_metadata(self, name):
+        """
+        Sends metadata of the repository from the cache
+
+        :param name: name of the repository
+        :type name: str
+        :return:
+        """
+        entry = self.server.cache.get(name)
+        if entry is None:
+            return self.send_error(404)
+
+        gzipped = entry.gzipped is not None and self.accepts_gzip()
+        data = entry.gzipped if gzipped else entry.data
+        etag = '{0}-gzip"'.format(entry.etag[:-1]) if gzipped else entry.etag
+
+        if self.is_not_modified(etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', VRequestHandler.CONTENT_TYPES['.json'])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def parse_range(self, size, etag):
+        """
+        Returns requested byte range of the file, None if the whole file should
+        be sent or False if the range is not satisfiable. Only single ranges
+        are supported, others are answered by the whole file.
+
+        :param size: size of the file
+        :type size: int
+        :param etag: entity tag of the file
+        :type etag: str
+        :return: tuple of the first and the last byte
+        """
+        value = self.headers.get('Range')
+        if not value or not value.startswith('bytes=') or ',' in value:
+            return None
+
+        # Resumed download of the changed file starts from scratch
+        condition = self.headers.get('If-Range')
+        if condition and condition.strip() != etag:
+            return None
+
+        first, _, last = value[len('bytes='):].strip().partition('-')
+
+        try:
+            if not first:
+                length = int(last)
+                if length <= 0:
+                    return False
+                return max(0, size - length), size - 1
+
+            first = int(first)
+            last = min(int(last), size - 1) if last else size - 1
+        except ValueError:
+            return None
+
+        if first >= size or first > last:
+            return False
+
+        return first, last
+
+    def send_file(self, path, etag=None):
+        """
+        Sends the file by sendfile if available, with support of conditional
+        and range requests
+
+        :param path: path to the file
+        :type path: str
+        :param etag: entity tag of the file, built from mtime and size if not given
+        :type etag: str
+        :return:
+        """
+        try:
+            stream = open(path, 'rb')
+        except (OSError, IOError, ValueError):
+            return self.send_error(404)
+
+        with stream:
+            st = os.fstat(stream.fileno())
+            if not os.path.isfile(path):
+                return self.send_error(404)
+
+            etag = etag or '"{0:x}-{1:x}"'.format(*VMetadataCache.key(st))
+
+            if self.is_not_modified(etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            selected = self.parse_range(st.st_size, etag)
+            if selected is False:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{0}'.format(st.st_size))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            first, last = selected or (0, st.st_size - 1)
+            length = last - first + 1
+
+            self.send_response(206 if selected else 200)
+            self.send_header('Content-Type', VRequestHandler.CONTENT_TYPES.get(
+                os.path.splitext(path)[1], "application/octet-stream"))
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+            if selected:
+                self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(first, last, st.st_size))
+            self.end_headers()
+
+            if self.command != 'HEAD' and length > 0:
+                self.copy_file(stream, first, length)
+
+    def copy_file(self, stream, offset, count):
+        """
+        Copies part of the file to the client, sendfile(2) is used by the
+        socket if available
+
+        :param stream: opened file
+        :param offset: position of the first byte
+        :type offset: int
+        :param count: amount of bytes
+        :type count: int
+        :return:
+        """
+        self.wfile.flush()
+
+        try:
+            if hasattr(self.connection, 'sendfile'):
+                self.connection.sendfile(stream, offset, count)
+                return
+
+            stream.seek(offset)
+            while count > 0:
+                chunk = stream.read(min(count, 1048576))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                count -= len(chunk)
+        except (OSError, IOError):
+            # Client has gone away, e.g. download was paused
+            self.close_connection = True
+
+
+class VServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server of the storage
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address, settings, verbose=False):
+        """
+        :param address: host and port to listen
+        :type address: tuple
+        :param settings: settings of the storage
+        :type settings: VSettings
+        :param verbose: log every request to stderr
+        :type verbose: bool
+        """
+        HTTPServer.__init__(self, address, VRequestHandler)
+
+        self.root = settings.storage_path
+        self.prefix = urlparse(settings.storage_url).path.rstrip('/')
+        self.cache = VMetadataCache(self.root)
+        self.verbose = verbose
+
+    @staticmethod
+    def address(settings, listen=None):
+        """
+        Returns address to listen by given host:port string, the port of the
+        storage URL on every interface is used by default
+
+        :param settings: settings of the storage
+        :type settings: VSettings
+        :param listen: host and port (e.g. 127.0.0.1:8080)
+        :type listen: str
+        :return: tuple
+        """
+        if listen:
+            host, _, port = listen.rpartition(':')
+            return host, int(port)
+
+        url = urlparse(settings.storage_url)
+
+        return '', url.port or (443 if url.scheme == 'https' else 80)
@@ -1,45 +1,149 @@
 #!/usr/bin/env python
 # coding: utf8
 
-import yaml
+import hashlib
+import json
+import os
+
+from .utils import write_atomic
+
+
+class VSettingsError(Exception):
+
+    def __init__(self, msg):
+        super(VSettingsError, self).__init__(msg)
+        self.msg = msg
 
 
 class VSettings:
+    """
+    Provides resolved configuration values as plain attributes. Validated
+    configuration is cached in the user's cache directory and reused until
+    the configuration file is changed.
+    """
+
+    # Default amount of concurrent workers for metadata I/O
+    DEFAULT_WORKERS = 8
+
+    # Default maximum amount of entries in the checksum cache
+    DEFAULT_CHECKSUM_CACHE_SIZE = 4096
+
+    # Format of the compiled configuration, cache with another format is ignored
+    CACHE_FORMAT = 2
+
+    # Name of the metrics file in the state directory unless storage.metrics is set
+    METRICS_FILENAME = "vgrepo.prom"
 
     @staticmethod
     def read(cnf):
         """
-        Parses YAML configuration file
+        Parses YAML configuration file, the C loader is used if available
 
         :param cnf: path to the configuration file
         :type cnf: str
-        :return:
+        :return: dict
         """
+        import yaml
+
         try:
             with open(cnf, 'r') as s:
-                return yaml.load(s)
+                return yaml.load(s, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
         except (yaml.YAMLError, IOError) as e:
-            print(e)
+            raise VSettingsError(str(e))
 
-        return False
+    @staticmethod
+    def compile(settings):
+        """
+        Validates parsed configuration and resolves values of the settings
 
-    def __init__(self, cnf):
-        self.settings = VSettings.read(cnf)
+        :param settings: parsed configuration
+        :type settings: dict
+        :return: dict
+        """
+        storage = settings.get('storage') if isinstance(settings, dict) else None
+        if not isinstance(storage, dict):
+            raise VSettingsError("storage section is not specified")
 
-    @property
-    def storage_url(self):
+        for key in ('path', 'url'):
+            if not storage.get(key):
+                raise VSettingsError("storage.{0} is not specified".format(key))
+
+        try:
+            workers = max(1, int(storage.get('workers') or VSettings.DEFAULT_WORKERS))
+            checksum_cache_size = int(storage.get('checksum_cache_size') or VSettings.DEFAULT_CHECKSUM_CACHE_SIZE)
+        except (TypeError, ValueError) as e:
+            raise VSettingsError(str(e))
+
+        path = str(storage.get('path'))
+        state_path = os.path.join(path, ".vgrepo")
+
+        return {
+            'storage_url': str(storage.get('url')).strip('/'),
+            'storage_path': path,
+            'state_path': state_path,
+            'metrics_path': str(storage.get('metrics') or os.path.join(state_path, VSettings.METRICS_FILENAME)),
+            'workers': workers,
+            'checksum_cache_size': checksum_cache_size,
+        }
+
+    @staticmethod
+    def cache_path(cnf):
         """
-        Returns URL of the published images
+        Returns path to the compiled configuration in the user's cache directory
 
+        :param cnf: path to the configuration file
+        :type cnf: str
         :return: str
         """
-        return self.settings.get('storage').get('url').strip('/')
+        root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        digest = hashlib.sha1(os.path.abspath(cnf).encode('utf-8')).hexdigest()
+
+        return os.path.join(root, 'vgrepo', "settings-{0}.json".format(digest))
 
-    @property
-    def storage_path(self):
+    @staticmethod
+    def load(cnf):
         """
-        Returns path for the repositories
+        Returns compiled configuration from the cache or parses the configuration
+        file if it was changed since the last run
 
-        :return: str
+        :param cnf: path to the configuration file
+        :type cnf: str
+        :return: dict
         """
-        return self.settings.get('storage').get('path')
+        try:
+            st = os.stat(cnf)
+        except (OSError, IOError) as e:
+            raise VSettingsError(str(e))
+
+        source = [VSettings.CACHE_FORMAT, getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size, st.st_ino]
+        path = VSettings.cache_path(cnf)
+
+        try:
+            with open(path, 'r') as stream:
+                cache = json.load(stream)
+            if cache.get('source') == source:
+                return cache['settings']
+        except (OSError, IOError, ValueError, KeyError, AttributeError):
+            pass
+
+        settings = VSettings.compile(VSettings.read(cnf))
+
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            write_atomic(path, json.dumps({'source': source, 'settings': settings}))
+        except (OSError, IOError):
+            # Caching is an optimization only, e.g. home directory may be read-only
+            pass
+
+        return settings
+
+    def __init__(self, cnf):
+        self.settings = VSettings.load(cnf)
+
+        self.storage_url = self.settings['storage_url']
+        self.storage_path = self.settings['storage_path']
+        self.state_path = self.settings['state_path']
+        self.metrics_path = self.settings['metrics_path']
+        self.workers = self.settings['workers']
+        self.checksum_cache_size = self.settings['checksum_cache_size']
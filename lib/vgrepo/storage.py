@@ -2,10 +2,18 @@
 # coding: utf8
 
 import os
+import sqlite3
+import sys
+import time
 
+from .catalog import VCatalog
+from .locks import VLock
+from .timings import VTimings
 from .settings import VSettings
-from .repository import VRepository
+from .repository import VRepository, VImageNotFound, VImageVersionFoundError
 from .meta.images import VMetadataImage, VMetadataVersion, VMetadataProvider
+from .meta.versions import VVersionIndex
+from .utils import file_sizes, gzip_compress, timer, write_atomic
 
 
 class VStorage:
@@ -13,10 +21,14 @@ class VStorage:
     Manages Vagrant repositories
     """
 
+    # Root catalog of the repositories served by the web server
+    CATALOG_FILENAME = "catalog.json"
+
     @staticmethod
     def list_dirs(path):
         """
-        Provides a simple directories list by given path
+        Provides a simple directories list by given path, hidden directories
+        (e.g. internal state of the storage) are skipped
 
         :param path: directory
         :type path: str
@@ -26,7 +38,7 @@ class VStorage:
         dirs = []
         try:
             dirs = [d for d in os.listdir(path)
-                    if os.path.isdir(os.path.join(path, d))
+                    if not d.startswith('.') and os.path.isdir(os.path.join(path, d))
                     ]
         except [OSError, IOError]:
             # TODO: add an exception
@@ -42,12 +54,175 @@ class VStorage:
         """
 
         self.settings = VSettings(cnf)
+        self._catalog = None
+
+    @property
+    def catalog(self):
+        """
+        Returns catalog of the storage, building it on the first use
+
+        :return: VCatalog
+        """
+        if self._catalog is None:
+            self._catalog = VCatalog(os.path.join(self.settings.state_path, VCatalog.FILENAME))
+            if not self._catalog.exists or self._catalog.version != VCatalog.VERSION:
+                self.reindex()
+
+        return self._catalog
+
+    @property
+    def catalog_path(self):
+        """
+        Returns path to the root catalog of the repositories
+
+        :return: str
+        """
+        return os.path.join(self.settings.storage_path, VStorage.CATALOG_FILENAME)
 
-    def add(self, src, name, version, desc='', provider='virtualbox'):
+    def lock(self):
+        """
+        Returns advisory lock of the storage which guards the root catalog
+
+        :return: VLock
+        """
+        return VLock(os.path.join(self.settings.state_path, "locks", ".catalog.lock"))
+
+    def export_catalog(self):
+        """
+        Writes the root catalog and its gzipped copy from the stored summaries,
+        should be called under the lock of the storage
+
+        :return: bool
+        """
+        data = self.catalog.export()
+
+        try:
+            write_atomic(self.catalog_path, data)
+            write_atomic("{0}.gz".format(self.catalog_path), gzip_compress(data))
+        except (OSError, IOError):
+            print("Error: unable to write catalog to '{0}'".format(self.catalog_path))
+            return False
+
+        return True
+
+    @staticmethod
+    def image_sizes(repo, known=None):
+        """
+        Returns sizes of the images of the repository by their versions, only
+        images which are not known yet are checked on the disk
+
+        :param repo: repository with loaded metadata
+        :type repo: VRepository
+        :param known: already recorded sizes by versions (optional)
+        :type known: dict
+        :return: dict
+        """
+        known = known or {}
+        sizes = {}
+
+        for v in repo.meta.versions:
+            if v.version in known:
+                sizes[v.version] = known[v.version]
+                continue
+            try:
+                sizes[v.version] = os.path.getsize(repo.get_image_path(v.version))
+            except (OSError, IOError):
+                sizes[v.version] = 0
+
+        return sizes
+
+    def export_metrics(self, error=None):
+        """
+        Writes the metrics file from the counters of the catalog
+
+        :param error: name of the failed command to count (optional)
+        :type error: str
+        :return: bool
+        """
+        from .metrics import VMetrics
+
+        with self.lock():
+            if error:
+                self.catalog.count(increments={('errors_total', VMetrics.labels(command=error)): 1})
+
+            return VMetrics(self.catalog).write(self.settings.metrics_path)
+
+    def account(self, ingests, seconds):
+        """
+        Adds ingested images to the counters of the catalog
+
+        :param ingests: published images
+        :type ingests: list of VIngestPipeline
+        :param seconds: duration of the ingest
+        :type seconds: float
+        :return:
+        """
+        if not ingests:
+            return
+
+        hashed = [p for i in ingests for p in i.phases if p.name == 'hash']
+        hash_bytes = sum(p.bytes for p in hashed)
+        hash_seconds = sum(p.seconds for p in hashed)
+        size = sum(max([p.bytes for p in i.phases] or [0]) for i in ingests)
+
+        values = {
+            ('last_ingest_duration_seconds', ''): seconds,
+            ('last_ingest_bytes', ''): size,
+            ('last_ingest_timestamp_seconds', ''): time.time(),
+        }
+        if hash_seconds > 0:
+            values[('last_hash_bytes_per_second', '')] = hash_bytes / hash_seconds
+
+        with self.lock():
+            self.catalog.count(increments={
+                ('ingests_total', ''): len(ingests),
+                ('ingested_bytes_total', ''): size,
+                ('hash_bytes_total', ''): hash_bytes,
+                ('hash_seconds_total', ''): hash_seconds,
+            }, values=values)
+
+    def repository(self, name, meta=None):
+        """
+        Returns repository which keeps the catalog in sync with its metadata.
+        Metadata is not read until it is needed, so the repository can be used
+        as a lightweight handle for paths and URLs (e.g. image_dir, repo_url).
+
+        :param name: identifier of the image
+        :type name: str
+        :param meta: already loaded metadata (optional)
+        :type meta: VMetadataImage
+        :return: VRepository
+        """
+
+        r = VRepository(name, self.settings, meta)
+        r.commit_hooks.append(self.on_commit)
+
+        return r
+
+    def on_commit(self, meta):
+        """
+        Updates catalog by metadata saved on the disk and regenerates the
+        root catalog
+
+        :param meta: metadata of the repository
+        :type meta: VMetadataImage
+        """
+
+        with self.lock(), VTimings.span('catalog'):
+            if meta.versions:
+                r = self.repository(meta.name, meta)
+                self.catalog.update(meta, r.repo_url, VStorage.image_sizes(r, self.catalog.sizes(meta.name)))
+            else:
+                self.catalog.remove(meta.name)
+
+            self.export_catalog()
+
+    def add(self, src, name, version, desc='', provider='virtualbox', mode='copy', size=None, checksum=None):
         """
         Adds new image to the repository by given parameters.
 
-        :param src: path to the loadable image file
+        :param src: path to the loadable image file or readable binary stream,
+        the stream is read once and requires the name of the image
         :type src: str
         :param name: identifier of the image
         :type name: str
@@ -57,13 +232,24 @@ class VStorage:
         :type desc: str
         :param provider: provide or the image (e.g. virtualbox)
         :type provider: str
+        :param mode: copy, hard link (link) or move the file into the repository,
+        images on another device are copied
+        :type mode: str
+        :param size: expected size of the image in bytes, the image is not added on mismatch
+        :type size: int
+        :param checksum: expected SHA256 checksum of the image, the image is not added on mismatch
+        :type checksum: str
+        :return: list of VIngestPipeline with per-phase statistics
         """
 
+        if not name and hasattr(src, 'read'):
+            raise ValueError("Name of the image is required for streams")
+
         if not name:
             name = os.path.basename(src).replace(".box", "")
 
         # Create new or use existing repository based by their metadata
-        r = VRepository(name, self.settings)
+        r = self.repository(name)
 
         img = VMetadataImage(
             name=name,
@@ -76,25 +262,196 @@ class VStorage:
             )]
         )
 
-        r.add(src, img)
+        started = timer()
+        r.add(src, img, mode, size, checksum)
+        self.account(r.ingests, timer() - started)
+
+        return r.ingests
+
+    def load(self, names):
+        """
+        Loads metadata of the repositories concurrently and yields them in
+        the order of the given names
+
+        :param names: identifiers of images
+        :type names: list
+        :return: generator of repositories
+        """
+
+        workers = min(self.settings.workers, len(names))
+        if workers < 2:
+            for name in names:
+                yield self.repository(name).reload()
+            return
+
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(workers)
+        try:
+            for r in pool.imap(lambda name: self.repository(name).reload(), names):
+                yield r
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def add_batch(self, entries):
+        """
+        Adds many images at once. Images are copied and hashed concurrently
+        and metadata of every repository is written once at the end.
+
+        :param entries: images to add
+        :type entries: list of VBatchEntry
+        :return: list of (VBatchEntry, VIngestPipeline or None on failure)
+        """
+
+        started = timer()
+        repos = {}
+        seen = set()
+
+        # Check the whole batch before copying anything
+        for e in entries:
+            if e.name not in repos:
+                repos[e.name] = self.repository(e.name)
+            if not os.path.isfile(e.src):
+                raise VImageNotFound(e.src)
+            key = (e.name, VVersionIndex.key(e.version))
+            if key in seen or repos[e.name].has_version(e.version):
+                raise VImageVersionFoundError(e.name, e.version)
+            seen.add(key)
+
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(max(1, min(self.settings.workers, len(entries))))
+        try:
+            ingests = pool.map(lambda e: repos[e.name].ingest_image(e.src, e.version), entries)
+        finally:
+            pool.close()
+            pool.join()
+
+        batches = {}
+        for i, (e, ingest) in enumerate(zip(entries, ingests)):
+            if ingest is not None:
+                v = VMetadataVersion(version=e.version, providers=[VMetadataProvider(name=e.provider)])
+                batches.setdefault(e.name, []).append((i, v, ingest))
+
+        # Every repository is published on its own, failure of one does not
+        # leave images of the others unpublished
+        for name, batch in batches.items():
+            try:
+                published = repos[name].publish([(v, ingest) for _, v, ingest in batch], entries[batch[0][0]].desc)
+            except VImageVersionFoundError as e:
+                print("Error: version {0} of {1} is already exists".format(e.version, e.name))
+                published = False
+
+            if not published:
+                for i, _, ingest in batch:
+                    repos[name].discard_image(ingest.dst)
+                    ingests[i] = None
+
+        self.account([i for r in repos.values() for i in r.ingests], timer() - started)
+
+        return list(zip(entries, ingests))
+
+    def scan(self, name=None):
+        """
+        Provides repositories by reading their metadata from the disk
+
+        :param name: identifier of image (optional)
+        :type name: str
+        :return: generator of repositories
+        """
+
+        if name:
+            return self.load([name])
+
+        return self.load(sorted(VStorage.list_dirs(self.settings.storage_path)))
+
+    def iterate(self, name=None):
+        """
+        Provides repositories on the storage one by one from the catalog. If
+        the catalog can not be read, the rest of repositories is scanned from
+        the disk.
+
+        :param name: identifier of image (optional)
+        :type name: str
+        :return: generator of repositories
+        """
+
+        last = None
+
+        try:
+            if name:
+                metas = [self.catalog.get(name)]
+            else:
+                metas = self.catalog.items()
+
+            for meta in metas:
+                r = self.repository(meta.name, meta) if meta else self.repository(name)
+                last = r.name
+                yield r
+            return
+        except (sqlite3.Error, OSError, IOError, ValueError):
+            # Errors go to stderr to keep machine-readable output of the commands valid
+            sys.stderr.write("Error: unable to read catalog, scanning {0}\n".format(self.settings.storage_path))
+
+        # Repositories are ordered by name in both sources, so the ones yielded already are skipped
+        for r in self.scan(name):
+            if last is None or r.name > last:
+                yield r
 
     def list(self, name=None):
         """
-        Provides list of the repositories on the storage
+        Provides list of the repositories on the storage from the catalog
 
         :param name: identifier of image (optional)
         :type name: str
         :return: list of repositories
         """
 
-        if name:
-            repos = [VRepository(name, self.settings)]
-        else:
-            repos = [VRepository(d, self.settings)
-                     for d in VStorage.list_dirs(self.settings.storage_path)
-                     ]
+        return list(self.iterate(name))
+
+    def rows(self, name=None):
+        """
+        Yields flat rows (one per provider of every version) of the repositories
 
-        return repos
+        :param name: identifier of image (optional)
+        :type name: str
+        :return: generator of dict
+        """
+
+        for repo in self.iterate(name):
+            for version in repo.info.versions:
+                for provider in version.providers or []:
+                    yield {
+                        'name': repo.name,
+                        'version': version.version,
+                        'provider': provider.name,
+                        'url': repo.repo_url,
+                        'box_url': provider.url,
+                        'checksum_type': provider.checksum_type,
+                        'checksum': provider.checksum,
+                    }
+
+    def reindex(self):
+        """
+        Rebuilds catalog from the metadata of every repository on the disk
+
+        :return: amount of indexed repositories
+        """
+
+        count = [0]
+
+        def items():
+            for r in self.scan():
+                if not r.is_empty:
+                    count[0] += 1
+                    yield r.meta, r.repo_url, VStorage.image_sizes(r)
+
+        with self.lock():
+            self.catalog.rebuild(items())
+            self.export_catalog()
+
+        return count[0]
 
     def remove(self, name, version):
         """
@@ -104,6 +461,124 @@ class VStorage:
         :param version: version of the image
         """
 
-        r = VRepository(name, self.settings)
+        r = self.repository(name)
 
         r.remove(version)
+
+    def prune(self, policy, name=None, dry_run=False):
+        """
+        Applies retention policy to the repositories, metadata of every
+        repository is written once and images are deleted concurrently
+
+        :param policy: retention rules
+        :type policy: VRetentionPolicy
+        :param name: identifier of image (optional)
+        :type name: str
+        :param dry_run: only report versions which would be removed
+        :type dry_run: bool
+        :return: generator of (name, list of removed VMetadataVersion or None on failure)
+        """
+
+        # Names are read before pruning since commits update the catalog
+        names = [r.name for r in self.iterate(name)]
+        if dry_run:
+            for n in names:
+                yield n, self.repository(n).prune(policy, dry_run=True)
+            return
+
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(self.settings.workers)
+        try:
+            for n in names:
+                yield n, self.repository(n).prune(policy, pool=pool)
+        finally:
+            pool.close()
+            pool.join()
+
+    def usage(self, name=None):
+        """
+        Provides sizes of the images recorded when they were added, so the
+        storage is not scanned. Providers of a version share the same image.
+
+        :param name: identifier of image (optional)
+        :type name: str
+        :return: generator of dict with name, version, providers and bytes
+        """
+
+        sizes = self.catalog.usage(name)
+
+        for repo in self.iterate(name):
+            for version in repo.info.versions:
+                yield {
+                    'name': repo.name,
+                    'version': version.version,
+                    'providers': [p.name for p in version.providers or []],
+                    'bytes': sizes.get((repo.name, version.version), 0),
+                }
+
+    def rescan(self, name=None):
+        """
+        Reconciles recorded sizes of the images with the disk, directories of
+        the repositories are scanned concurrently
+
+        :param name: identifier of image (optional)
+        :type name: str
+        :return: list of (name, version, recorded bytes, actual bytes) which differed,
+        repositories which could not be read are skipped
+        """
+
+        def scan(repo):
+            try:
+                found = file_sizes(repo.image_dir)
+            except (OSError, IOError):
+                # Recorded sizes are kept rather than reset by a failed scan
+                sys.stderr.write("Error: unable to read {0}\n".format(repo.image_dir))
+                return repo.name, None
+            return repo.name, dict(
+                (v.version, found.get(os.path.basename(repo.get_image_path(v.version)), 0))
+                for v in repo.meta.versions
+            )
+
+        repos = self.list(name)
+
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(max(1, min(self.settings.workers, len(repos))))
+        try:
+            scanned = pool.map(scan, repos)
+        finally:
+            pool.close()
+            pool.join()
+
+        changes = []
+
+        # Versions added or removed while scanning are left to their commits
+        with self.lock():
+            for n, actual in scanned:
+                if actual is None:
+                    continue
+                recorded = self.catalog.sizes(n)
+                changed = dict((v, size) for v, size in actual.items() if v in recorded and recorded[v] != size)
+                if changed:
+                    self.catalog.resize(n, changed)
+                    changes += [(n, v, recorded[v], size) for v, size in sorted(changed.items())]
+
+        return changes
+
+    def verify(self, name=None, since=None, workers=None):
+        """
+        Provides integrity check of the images against checksums in their metadata
+
+        :param name: identifier of image (optional)
+        :type name: str
+        :param since: skip images changed before given UNIX timestamp (optional)
+        :type since: float
+        :param workers: amount of worker processes (optional)
+        :type workers: int
+        :return: VVerifier which yields results by run()
+        """
+
+        from .verify import VVerifier
+
+        return VVerifier(self.iterate(name), workers=workers, since=since)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import threading
+
+from .utils import timer
+
+
+class VSpan(object):
+    """
+    Measures duration of the operation and amount of processed bytes
+    """
+
+    __slots__ = ('name', 'bytes', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+        self.started = None
+
+    def __enter__(self):
+        self.started = timer()
+        return self
+
+    def __exit__(self, *exc):
+        VTimings.record(self.name, timer() - self.started, self.bytes)
+        return False
+
+
+class VNullSpan(object):
+    """
+    Span which records nothing, it is used while timings are disabled. The
+    single instance is shared by every caller, so processed bytes are dropped.
+    """
+
+    __slots__ = ()
+
+    @property
+    def bytes(self):
+        return 0
+
+    @bytes.setter
+    def bytes(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class VTimings:
+    """
+    Collects timings of the operations (e.g. hash, copy, load_meta, dump_meta,
+    rmtree) and passes them to registered hooks. While no hook is registered
+    spans cost a single attribute check.
+    """
+
+    active = False
+
+    hooks = []
+
+    # Totals by name of the operation: [count, seconds, bytes]
+    totals = {}
+
+    mutex = threading.Lock()
+
+    NULL_SPAN = VNullSpan()
+
+    @staticmethod
+    def span(name):
+        """
+        Returns context manager which measures the operation
+
+        :param name: name of the operation
+        :type name: str
+        :return: VSpan
+        """
+        return VSpan(name) if VTimings.active else VTimings.NULL_SPAN
+
+    @staticmethod
+    def record(name, seconds, size=0):
+        """
+        Passes measured operation to the hooks
+
+        :param name: name of the operation
+        :type name: str
+        :param seconds: duration of the operation
+        :type seconds: float
+        :param size: amount of processed bytes
+        :type size: int
+        :return:
+        """
+        for hook in list(VTimings.hooks):
+            hook(name, seconds, size)
+
+    @staticmethod
+    def register(hook):
+        """
+        Registers callable which receives name, duration in seconds and amount
+        of bytes of every measured operation, it may be called from several threads
+
+        :param hook: callable
+        :return:
+        """
+        VTimings.hooks.append(hook)
+        VTimings.active = True
+
+    @staticmethod
+    def unregister(hook):
+        """
+        Removes registered hook
+
+        :param hook: callable
+        :return:
+        """
+        if hook in VTimings.hooks:
+            VTimings.hooks.remove(hook)
+        VTimings.active = bool(VTimings.hooks)
+
+    @staticmethod
+    def accumulate(name, seconds, size):
+        """
+        Hook which sums up the operations by their names
+
+        :return:
+        """
+        with VTimings.mutex:
+            total = VTimings.totals.setdefault(name, [0, 0.0, 0])
+            total[0] += 1
+            total[1] += seconds
+            total[2] += size
+
+    @staticmethod
+    def enable():
+        """
+        Starts collecting totals of the operations
+
+        :return:
+        """
+        if VTimings.accumulate not in VTimings.hooks:
+            VTimings.register(VTimings.accumulate)
+
+    @staticmethod
+    def summary():
+        """
+        Returns totals of the operations by their names
+
+        :return: dict
+        """
+        with VTimings.mutex:
+            return dict((name, {'count': t[0], 'seconds': t[1], 'bytes': t[2]})
+                        for name, t in VTimings.totals.items())
+
+    @staticmethod
+    def report():
+        """
+        Returns human-readable lines with totals of the operations, the slowest first
+
+        :return: list
+        """
+        lines = ["{0:<12}{1:>8}{2:>12}{3:>12}{4:>12}".format("operation", "count", "seconds", "MB", "MB/s")]
+
+        for name, t in sorted(VTimings.summary().items(), key=lambda i: -i[1]['seconds']):
+            lines.append("{0:<12}{1:>8}{2:>12.3f}{3:>12.1f}{4:>12}".format(
+                name,
+                t['count'],
+                t['seconds'],
+                t['bytes'] / 1048576.0,
+                "{0:.1f}".format(t['bytes'] / 1048576.0 / t['seconds']) if t['bytes'] and t['seconds'] > 0 else '-',
+            ))
+
+        return lines
@@ -1,12 +1,22 @@
-import collections
 import sys
 import datetime
+import os
+import tempfile
+import time
 
 try:
     import json
 except ImportError:
     import simplejson as json
 
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
+
+# Monotonic high-resolution clock where available
+timer = getattr(time, 'perf_counter', time.time)
+
 
 class VJSONEncoder(json.JSONEncoder):
 
@@ -23,7 +33,7 @@ class VJSONEncoder(json.JSONEncoder):
         if isinstance(obj, datetime.datetime):
             return obj.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-        if isinstance(obj, collections.Iterable) and not self.is_string(obj):
+        if isinstance(obj, Iterable) and not self.is_string(obj):
             try:
                 data = {}
                 for k, v in obj.items():
@@ -33,3 +43,141 @@ class VJSONEncoder(json.JSONEncoder):
                 return [self.default(e) for e in obj]
 
         return obj
+
+
+def parse_timestamp(value, now=None):
+    """
+    Returns UNIX timestamp by given date (YYYY-MM-DD[THH:MM:SS]) or age
+    relative to the current time (e.g. 30m, 12h, 7d, 2w)
+
+    :param value: date or age string
+    :type value: str
+    :param now: current UNIX timestamp
+    :type now: float
+    :return: float
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+    if now is None:
+        now = time.time()
+
+    value = value.strip()
+    if value[-1:] in units and value[:-1].isdigit():
+        return now - int(value[:-1]) * units[value[-1]]
+
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return time.mktime(datetime.datetime.strptime(value, fmt).timetuple())
+        except ValueError:
+            pass
+
+    raise ValueError("Invalid date or age: {0}".format(value))
+
+
+def format_size(size):
+    """
+    Returns human-readable size (e.g. 1.5 GB)
+
+    :param size: amount of bytes
+    :type size: int
+    :return: str
+    """
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(size) < 1024.0 or unit == 'TB':
+            return "{0:.0f} {1}".format(size, unit) if unit == 'B' else "{0:.1f} {1}".format(size, unit)
+        size /= 1024.0
+
+
+def file_sizes(path):
+    """
+    Returns sizes of the regular files in the directory by their names,
+    os.scandir is used where available so the entries are not stat'ed twice
+
+    :param path: directory
+    :type path: str
+    :return: dict
+    """
+    sizes = {}
+
+    if hasattr(os, 'scandir'):
+        for entry in os.scandir(path):
+            if entry.is_file(follow_symlinks=False):
+                sizes[entry.name] = entry.stat(follow_symlinks=False).st_size
+        return sizes
+
+    import stat
+
+    for name in os.listdir(path):
+        st = os.lstat(os.path.join(path, name))
+        if stat.S_ISREG(st.st_mode):
+            sizes[name] = st.st_size
+
+    return sizes
+
+
+def gzip_compress(data):
+    """
+    Returns gzip stream of the data with zero modification time, so equal
+    data always produces equal files (e.g. for nginx gzip_static)
+
+    :param data: data to compress
+    :type data: str or bytes
+    :return: bytes
+    """
+    import gzip
+    import io
+
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+
+    buf = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=buf, mtime=0) as stream:
+        stream.write(data)
+
+    return buf.getvalue()
+
+
+def write_atomic(path, data, mode=0o644):
+    """
+    Writes data to the file atomically: readers see either old or new content,
+    but never a partially written file
+
+    :param path: path to the file
+    :type path: str
+    :param data: content of the file
+    :type data: str or bytes
+    :param mode: permissions of the new file
+    :type mode: int
+    :return:
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+
+    fd, tmp = tempfile.mkstemp(prefix=".{0}.".format(os.path.basename(path)), suffix=".tmp", dir=directory)
+    try:
+        if os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o7777
+
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as stream:
+            os.fchmod(stream.fileno(), mode)
+            stream.write(data)
+            stream.flush()
+            os.fsync(stream.fileno())
+
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    # Make the rename itself durable
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except (OSError, IOError):
+        return
+    try:
+        os.fsync(fd)
+    except (OSError, IOError):
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import hashlib
+import multiprocessing
+import os
+
+from .utils import timer
+
+
+class VVerifyResult:
+    """
+    Result of the integrity check of a single image
+    """
+
+    def __init__(self, name, version, path, size, expected, actual=None, seconds=0.0, error=None):
+        """
+        :param name: name of the repository
+        :type name: str
+        :param version: version of the image
+        :type version: str
+        :param path: path to the image file
+        :type path: str
+        :param size: size of the image file in bytes
+        :type size: int
+        :param expected: checksum saved in the metadata
+        :type expected: str
+        :param actual: checksum of the image file on the disk
+        :type actual: str
+        :param seconds: time spent on hashing
+        :type seconds: float
+        :param error: error message if the image could not be read
+        :type error: str
+        """
+        self.name = name
+        self.version = version
+        self.path = path
+        self.size = size
+        self.expected = expected
+        self.actual = actual
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self):
+        """
+        Returns does the checksum of the image match its metadata or not
+
+        :return: bool
+        """
+        return self.error is None and self.expected == self.actual
+
+    @property
+    def rate(self):
+        """
+        Returns hashing throughput in bytes per second
+
+        :return: float
+        """
+        return self.size / self.seconds if self.seconds > 0 else 0.0
+
+
+class VVerifySummary:
+    """
+    Accumulates results of the integrity check
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = timer()
+        self.seconds = 0.0
+
+    def add(self, result):
+        """
+        Accounts given result in the summary
+
+        :param result: result of the check
+        :type result: VVerifyResult
+        :return:
+        """
+        self.files += 1
+        self.bytes += result.size
+        self.failed += 0 if result.ok else 1
+        self.seconds = timer() - self.started
+
+    @property
+    def rate(self):
+        """
+        Returns overall throughput in bytes per second
+
+        :return: float
+        """
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return "{files} images, {failed} failed, {size:.1f} MB in {seconds:.2f}s ({rate:.1f} MB/s)".format(
+            files=self.files,
+            failed=self.failed,
+            size=self.bytes / 1048576.0,
+            seconds=self.seconds,
+            rate=self.rate / 1048576.0,
+        )
+
+
+def verify_image(result):
+    """
+    Computes SHA256 checksum of the image in the worker process
+
+    :param result: pending result of the check
+    :type result: VVerifyResult
+    :return: VVerifyResult
+    """
+    sha256 = hashlib.sha256()
+    started = timer()
+
+    try:
+        with open(result.path, 'rb') as stream:
+            while True:
+                chunk = stream.read(VVerifier.BUFFER_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+    except (OSError, IOError) as e:
+        result.error = str(e)
+    else:
+        result.actual = sha256.hexdigest()
+
+    result.seconds = timer() - started
+
+    return result
+
+
+class VVerifier:
+    """
+    Re-hashes images of the repositories in a pool of processes
+    """
+
+    BUFFER_SIZE = 1048576
+
+    def __init__(self, repos, workers=None, since=None):
+        """
+        :param repos: list of repositories to check
+        :type repos: collections.Iterable
+        :param workers: amount of worker processes
+        :type workers: int
+        :param since: skip images changed before given UNIX timestamp
+        :type since: float
+        """
+        self.repos = repos
+        self.workers = workers or multiprocessing.cpu_count()
+        self.since = since
+        self.summary = VVerifySummary()
+
+    def tasks(self):
+        """
+        Returns pending checks ordered by size of the image, the largest first
+
+        :return: list of VVerifyResult
+        """
+        tasks = []
+
+        for repo in self.repos:
+            for v in repo.info.versions:
+                path = repo.get_image_path(v.version)
+                expected = v.providers[0].checksum if v.providers else None
+
+                try:
+                    st = os.stat(path)
+                except (OSError, IOError) as e:
+                    tasks.append(VVerifyResult(repo.info.name, v.version, path, 0, expected, error=str(e)))
+                    continue
+
+                # Change time also covers images copied with preserved modification time
+                if self.since is None or st.st_ctime >= self.since:
+                    tasks.append(VVerifyResult(repo.info.name, v.version, path, st.st_size, expected))
+
+        return sorted(tasks, key=lambda t: t.size, reverse=True)
+
+    def run(self):
+        """
+        Yields results of the checks as soon as each image is hashed
+
+        :return: generator of VVerifyResult
+        """
+        tasks = self.tasks()
+        self.summary = VVerifySummary()
+
+        pending = []
+        for task in tasks:
+            if task.error:
+                self.summary.add(task)
+                yield task
+            else:
+                pending.append(task)
+
+        if not pending:
+            return
+
+        pool = multiprocessing.Pool(min(self.workers, len(pending)))
+        try:
+            for result in pool.imap_unordered(verify_image, pending, chunksize=1):
+                self.summary.add(result)
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()